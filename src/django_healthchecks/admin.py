@@ -6,6 +6,7 @@ from django.utils.timesince import timeuntil
 from django.utils.timezone import is_aware, localtime
 from django.utils.translation import gettext_lazy as _
 
+from django_healthchecks.heartbeats import get_backend
 from django_healthchecks.models import HeartbeatMonitor
 
 
@@ -34,7 +35,19 @@ class HeartbeatMonitorAdmin(admin.ModelAdmin):
         # Only code calling HeartbeatMonitor.update() can add objects
         return False
 
+    def get_object(self, request, object_id, from_field=None):
+        object = super().get_object(request, object_id, from_field=from_field)
+        return self._apply_backend(object)
+
+    def _apply_backend(self, object):
+        """Show the last beat that is tracked by the heartbeat backend."""
+        if object is not None:
+            object.last_beat = get_backend().get_last_beat(object)
+            object.expires_at = object.calculate_expires_at()
+        return object
+
     def last_beat_column(self, object):
+        self._apply_backend(object)
         last_beat = object.last_beat
         if is_aware(last_beat):
             # Only for USE_TZ=True
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class HealthchecksConfig(AppConfig):
+    name = "django_healthchecks"
+    default_auto_field = "django.db.models.AutoField"
+
+    def ready(self):
+        # This also connects the receiver that starts the refresher.
+        from django_healthchecks.checker import get_registry
+
+        get_registry()
@@ -0,0 +1,192 @@
+"""Storage backends for heartbeats.
+
+The backend is configured with the ``HEALTHCHECKS_HEARTBEAT_BACKEND``
+setting. The monitors themselves are always stored in the database, so their
+timeouts can be managed in the Django admin.
+"""
+
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.timezone import now
+
+from django_healthchecks.models import HeartbeatMonitor
+
+# The number of rows fetched per round trip when iterating over heartbeats.
+ITERATOR_CHUNK_SIZE = 2000
+
+
+class BaseHeartbeatBackend(object):
+    """Interface for the heartbeat backends."""
+
+    def update_heartbeat(self, name, default_timeout=None, timeout=None):
+        """Track a new pulse for a single heartbeat."""
+        self.update_heartbeats({name: (now(), default_timeout, timeout)})
+
+    def update_heartbeats(self, beats):
+        """Track new pulses.
+
+        :param beats: A dict of ``name: (last_beat, default_timeout, timeout)``.
+        """
+        raise NotImplementedError()
+
+    def get_expired_heartbeats(self):
+        """Provide a list of all enabled heartbeats that expired."""
+        raise NotImplementedError()
+
+    def get_heartbeat_statuses(self):
+        """Provide a dict of ``name: is_expired`` for every enabled heartbeat.
+
+        The ``__all__`` key tells whether all heartbeats are healthy,
+        i.e. none of them expired.
+        """
+        raise NotImplementedError()
+
+    def iter_heartbeat_statuses(self, prefix=None, after=None, limit=None):
+        """Iterate over ``(name, is_expired)`` of the enabled heartbeats,
+        ordered by name. The rows are fetched in chunks, so memory usage
+        doesn't grow with the number of heartbeats.
+
+        :param prefix: Only include the names that start with this prefix.
+        :param after: Only include the names that sort after this name.
+        :param limit: The maximum number of heartbeats to give.
+        """
+        raise NotImplementedError()
+
+    def iter_heartbeat_expiry(self, prefix=None, after=None, limit=None):
+        """Iterate over ``(name, expires_at)`` of the enabled heartbeats,
+        ordered by name. The ``expires_at`` is ``None`` when there was no
+        beat yet. The parameters are the same as
+        :meth:`iter_heartbeat_statuses`.
+        """
+        raise NotImplementedError()
+
+    def get_last_beat(self, monitor):
+        """Tell when the last beat of the :class:`HeartbeatMonitor` was."""
+        return monitor.last_beat
+
+
+class ModelBackend(BaseHeartbeatBackend):
+    """Track the heartbeats in the ``HeartbeatMonitor`` table (the default)."""
+
+    def update_heartbeat(self, name, default_timeout=None, timeout=None):
+        HeartbeatMonitor._update(
+            name=name, default_timeout=default_timeout, timeout=timeout
+        )
+
+    def update_heartbeats(self, beats):
+        HeartbeatMonitor._update_many(beats)
+
+    def get_expired_heartbeats(self):
+        return HeartbeatMonitor.objects.enabled().expired_names()
+
+    def get_heartbeat_statuses(self):
+        data = HeartbeatMonitor.objects.enabled().status_by_name()
+        data["__all__"] = not any(data.values())
+        return data
+
+    def iter_heartbeat_statuses(self, prefix=None, after=None, limit=None):
+        monitors = HeartbeatMonitor.objects.enabled().filter_names(prefix, after)
+        monitors = monitors.annotate_is_expired().values_list("name", "is_expired")
+        return monitors[:limit].iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+    def iter_heartbeat_expiry(self, prefix=None, after=None, limit=None):
+        monitors = HeartbeatMonitor.objects.enabled().filter_names(prefix, after)
+        monitors = monitors.values_list("name", "expires_at")
+        return monitors[:limit].iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+class CacheBackend(BaseHeartbeatBackend):
+    """Track the heartbeats in a Django cache, e.g. Redis.
+
+    Each beat is a single cache write. The database is only written when a
+    heartbeat is registered, or when its timeout is forcefully updated.
+    Use a cache that doesn't evict keys; when a beat is no longer cached,
+    the ``last_beat`` of the registration in the database is used instead.
+
+    The cache is configured with ``HEALTHCHECKS_HEARTBEAT_CACHE_ALIAS``.
+    """
+
+    key_prefix = "healthchecks:heartbeat:"
+
+    def __init__(self):
+        # The names (and forced timeouts) known to exist in the database.
+        self._registered = {}
+
+    @property
+    def cache(self):
+        return caches[
+            getattr(settings, "HEALTHCHECKS_HEARTBEAT_CACHE_ALIAS", "default")
+        ]
+
+    def update_heartbeats(self, beats):
+        self._register(beats)
+        self.cache.set_many(
+            {self.key_prefix + name: beat[0] for name, beat in beats.items()},
+            timeout=None,
+        )
+
+    def get_expired_heartbeats(self):
+        statuses = self._get_statuses()
+        return [name for name, is_expired in statuses.items() if is_expired]
+
+    def get_heartbeat_statuses(self):
+        data = self._get_statuses()
+        data["__all__"] = not any(data.values())
+        return data
+
+    def get_last_beat(self, monitor):
+        return self.cache.get(self.key_prefix + monitor.name) or monitor.last_beat
+
+    def iter_heartbeat_statuses(self, prefix=None, after=None, limit=None):
+        t = now()
+        for name, expires_at in self.iter_heartbeat_expiry(prefix, after, limit):
+            yield name, expires_at is not None and expires_at < t
+
+    def iter_heartbeat_expiry(self, prefix=None, after=None, limit=None):
+        monitors = HeartbeatMonitor.objects.enabled().filter_names(prefix, after)
+        monitors = monitors.values_list("name", "timeout", "last_beat")[:limit]
+        monitors = monitors.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        while True:
+            chunk = list(islice(monitors, ITERATOR_CHUNK_SIZE))
+            if not chunk:
+                return
+            yield from self._get_chunk_expiry(chunk)
+
+    def _get_statuses(self):
+        monitors = HeartbeatMonitor.objects.enabled().values_list(
+            "name", "timeout", "last_beat"
+        )
+        t = now()
+        return {
+            name: expires_at is not None and expires_at < t
+            for name, expires_at in self._get_chunk_expiry(list(monitors))
+        }
+
+    def _get_chunk_expiry(self, monitors):
+        """Give the ``(name, expires_at)`` for ``(name, timeout, last_beat)``
+        rows, by reading the beats of all rows from the cache at once.
+        """
+        last_beats = self.cache.get_many([self.key_prefix + m[0] for m in monitors])
+
+        for name, timeout, last_beat in monitors:
+            last_beat = last_beats.get(self.key_prefix + name) or last_beat
+            yield name, (last_beat + timeout if last_beat is not None else None)
+
+    def _register(self, beats):
+        """Make sure the monitors exist in the database, and the forced
+        timeouts are stored. This only queries for unseen changes.
+        """
+        changed = {
+            name: beat
+            for name, beat in beats.items()
+            if name not in self._registered
+            or (beat[2] is not None and self._registered[name] != beat[2])
+        }
+        if not changed:
+            return
+
+        HeartbeatMonitor._update_many(changed)
+        for name, (last_beat, default_timeout, timeout) in changed.items():
+            self._registered[name] = timeout
@@ -1,78 +1,1604 @@
+import asyncio
 import base64
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import copy
 import functools
+import hashlib
 import inspect
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from http.cookiejar import DefaultCookiePolicy
 
 import requests
+from asgiref.sync import async_to_sync
 from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_started, setting_changed
+from django.db import close_old_connections, connections
+from django.dispatch import receiver
 from django.utils.encoding import force_str
 from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from django_healthchecks.signals import check_finished
+
+logger = logging.getLogger(__name__)
 
 
 class PermissionDenied(Exception):
     pass
 
 
-def create_report(request=None):
+CheckResult = collections.namedtuple("CheckResult", ["value", "checked_at"])
+
+
+class ResultCache(object):
+    """Store the latest result of each check.
+
+    Results are kept in process memory, unless ``HEALTH_CHECKS_CACHE_ALIAS``
+    points to a Django cache which can be shared between processes.
+    """
+
+    key_prefix = "healthchecks:result:"
+
+    def __init__(self):
+        self._results = {}
+
+    def get(self, service):
+        """Return the stored :class:`CheckResult` for the service, if any."""
+        cache = self._get_cache()
+        if cache is not None:
+            return cache.get(self.key_prefix + service)
+        return self._results.get(service)
+
+    def get_many(self, services):
+        """Return a dict with the stored results for the given services."""
+        cache = self._get_cache()
+        if cache is not None:
+            keys = {self.key_prefix + service: service for service in services}
+            return {keys[key]: result for key, result in cache.get_many(keys).items()}
+        return {
+            service: self._results[service]
+            for service in services
+            if service in self._results
+        }
+
+    def set(self, service, result, timeout=None):
+        """Store a :class:`CheckResult`, the timeout is in seconds."""
+        cache = self._get_cache()
+        if cache is not None:
+            cache.set(self.key_prefix + service, result, timeout)
+        else:
+            self._results[service] = result
+
+    @property
+    def is_shared(self):
+        """Tell whether the results are stored in a Django cache."""
+        return self._get_cache() is not None
+
+    def clear(self):
+        """Forget all results stored in process memory."""
+        self._results.clear()
+
+    def _get_cache(self):
+        alias = getattr(settings, "HEALTH_CHECKS_CACHE_ALIAS", None)
+        return caches[alias] if alias else None
+
+
+result_cache = ResultCache()
+
+CheckMetric = collections.namedtuple(
+    "CheckMetric",
+    ["healthy", "checked_at", "duration", "runs", "failures", "timeouts"],
+)
+
+
+class CheckMetrics(object):
+    """Track the outcome, duration and number of runs of each check.
+
+    These are exposed by the metrics endpoint, so a scrape doesn't need to
+    run the checks. Like the :class:`ResultCache`, the metrics are kept in
+    process memory unless ``HEALTH_CHECKS_CACHE_ALIAS`` is configured.
+    """
+
+    key_prefix = "healthchecks:metrics:"
+    counters = ("runs", "failures", "timeouts")
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def record(self, service, value, duration):
+        """Track a single run of the check, the duration is in seconds."""
+        healthy = bool(value)
+        latest = (healthy, time.time(), duration)
+        cache = result_cache._get_cache()
+        if cache is not None:
+            cache.set(self.key_prefix + service, latest, None)
+            self._incr(cache, service, "runs")
+            if not healthy:
+                self._incr(cache, service, "failures")
+            return
+
+        with self._lock:
+            metric = self._metrics.get(service) or CheckMetric(
+                None, None, None, 0, 0, 0
+            )
+            self._metrics[service] = metric._replace(
+                healthy=healthy,
+                checked_at=latest[1],
+                duration=duration,
+                runs=metric.runs + 1,
+                failures=metric.failures + (not healthy),
+            )
+
+    def record_timeout(self, service):
+        """Track that the check didn't finish before its deadline. The check
+        is unhealthy from now on, and the duration is unknown.
+        """
+        latest = (False, time.time(), None)
+        cache = result_cache._get_cache()
+        if cache is not None:
+            cache.set(self.key_prefix + service, latest, None)
+            self._incr(cache, service, "timeouts")
+            return
+
+        with self._lock:
+            metric = self._metrics.get(service) or CheckMetric(
+                None, None, None, 0, 0, 0
+            )
+            self._metrics[service] = metric._replace(
+                healthy=False,
+                checked_at=latest[1],
+                duration=None,
+                timeouts=metric.timeouts + 1,
+            )
+
+    def get_many(self, services):
+        """Return a dict with the :class:`CheckMetric` of the given services."""
+        cache = result_cache._get_cache()
+        if cache is None:
+            with self._lock:
+                return {
+                    service: self._metrics[service]
+                    for service in services
+                    if service in self._metrics
+                }
+
+        keys = {}
+        for service in services:
+            keys[self.key_prefix + service] = (service, None)
+            for counter in self.counters:
+                keys["%s%s:%s" % (self.key_prefix, service, counter)] = (
+                    service,
+                    counter,
+                )
+
+        values = collections.defaultdict(dict)
+        for key, value in cache.get_many(keys).items():
+            service, counter = keys[key]
+            values[service][counter] = value
+
+        metrics = {}
+        for service, data in values.items():
+            healthy, checked_at, duration = data.pop(None, (None, None, None))
+            counts = [data.get(counter, 0) for counter in self.counters]
+            metrics[service] = CheckMetric(healthy, checked_at, duration, *counts)
+        return metrics
+
+    def clear(self):
+        """Forget all metrics stored in process memory."""
+        with self._lock:
+            self._metrics.clear()
+
+    def _incr(self, cache, service, counter):
+        key = "%s%s:%s" % (self.key_prefix, service, counter)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # This is the first run, or the key was evicted. Another process
+            # may create the key at the same time.
+            if not cache.add(key, 1, None):
+                cache.incr(key)
+
+
+check_metrics = CheckMetrics()
+
+
+class CircuitBreaker(object):
+    """Stop running checks that keep failing for a while.
+
+    After ``HEALTH_CHECKS_CIRCUIT_BREAKER_THRESHOLD`` consecutive failures,
+    the circuit of a check opens: the check is reported as failed without
+    running it. After ``HEALTH_CHECKS_CIRCUIT_BREAKER_COOLDOWN`` seconds a
+    single trial run is let through, which closes the circuit on success.
+    The state is kept per process.
+    """
+
+    def __init__(self):
+        self._failures = {}
+        self._opened_at = {}
+        self._lock = threading.Lock()
+
+    def allow(self, service):
+        """Tell whether the check may run now."""
+        opened_at = self._opened_at.get(service)
+        if opened_at is None:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            opened_at = self._opened_at.get(service)
+            if opened_at is None:
+                return True
+            if now - opened_at < _get_circuit_breaker_cooldown(service):
+                return False
+
+            # Let a single trial through, others wait for another cool-down.
+            self._opened_at[service] = now
+            return True
+
+    def record(self, service, healthy):
+        """Track the outcome of a run of the check."""
+        with self._lock:
+            if healthy:
+                self._failures.pop(service, None)
+                self._opened_at.pop(service, None)
+                return
+
+            failures = self._failures[service] = self._failures.get(service, 0) + 1
+            threshold = _get_circuit_breaker_threshold(service)
+            if service not in self._opened_at and failures >= threshold:
+                logger.warning(
+                    "Healthcheck %r failed %d times, skipping it for %s seconds",
+                    service,
+                    failures,
+                    _get_circuit_breaker_cooldown(service),
+                )
+                self._opened_at[service] = time.monotonic()
+
+    def is_open(self, service):
+        return service in self._opened_at
+
+    def clear(self):
+        """Close all circuits."""
+        with self._lock:
+            self._failures.clear()
+            self._opened_at.clear()
+
+
+circuit_breaker = CircuitBreaker()
+
+
+class _Flight(object):
+    """A single run of a check, that concurrent callers wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.exception = None
+
+    def get_result(self):
+        if self.exception is not None:
+            # Each waiter raises its own exception, as raising the same
+            # instance in multiple threads mixes up their tracebacks.
+            raise _copy_exception(self.exception) from self.exception
+        return self.value
+
+
+def _copy_exception(exception):
+    try:
+        return copy.copy(exception)
+    except Exception:
+        return RuntimeError("The shared run of the check failed: %r" % exception)
+
+
+class SingleFlight(object):
+    """Let concurrent callers of the same check share the result of a single
+    run, instead of all running the check at once.
+
+    When ``HEALTH_CHECKS_SINGLE_FLIGHT_CACHE_ALIAS`` points to a Django cache,
+    a lock in that cache also makes other processes wait for the result.
+    The lock expires after the ``HEALTH_CHECKS_TIMEOUT`` of the check, or
+    :attr:`lock_timeout` seconds. Callers wait no longer than that for the
+    result either, after which the check is reported as failed.
+    """
+
+    key_prefix = "healthchecks:flight:"
+    lock_timeout = 10
+    poll_interval = 0.05
+
+    def __init__(self):
+        self._flights = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def run(self, service, check_func):
+        """Run the check, or wait for the run that is already in flight."""
+        with self._lock:
+            flight = self._flights.get(service)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[service] = _Flight()
+
+        if not is_leader:
+            if not flight.done.wait(self._get_timeout(service)):
+                logger.warning("Healthcheck %r timed out waiting for its run", service)
+                return False
+            return flight.get_result()
+
+        try:
+            flight.value = self._run_shared(service, check_func)
+        except Exception as e:
+            flight.exception = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(service) is flight:
+                    del self._flights[service]
+            flight.done.set()
+        return flight.value
+
+    async def arun(self, service, check_func):
+        """Async version of :meth:`run`, for callers in the same event loop."""
+        key = (asyncio.get_running_loop(), service)
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(check_func())
+            task.add_done_callback(functools.partial(self._discard_task, key))
+
+        # Cancelling a waiter (e.g. on a timeout) doesn't cancel the others.
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(task), self._get_timeout(service)
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Healthcheck %r timed out waiting for its run", service)
+            return False
+
+    def clear(self):
+        """Forget the runs in flight, new calls start their own run."""
+        with self._lock:
+            self._flights.clear()
+            self._tasks.clear()
+
+    def _discard_task(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    def _run_shared(self, service, check_func):
+        cache = self._get_cache()
+        if cache is None:
+            return check_func()
+
+        lock_key = self.key_prefix + service + ":lock"
+        result_key = self.key_prefix + service + ":result"
+        timeout = self._get_timeout(service)
+        started = time.time()
+
+        waited = False
+        while not cache.add(lock_key, started, timeout):
+            # Another process runs the check, wait for its result.
+            waited = True
+            time.sleep(self.poll_interval)
+            result = cache.get(result_key)
+            if result is not None and result.checked_at >= started:
+                return result.value
+            if time.time() - started >= timeout:
+                return check_func()
+
+        try:
+            if waited:
+                # The result may be stored just before the lock was released.
+                result = cache.get(result_key)
+                if result is not None and result.checked_at >= started:
+                    return result.value
+
+            value = check_func()
+            cache.set(result_key, CheckResult(value, time.time()), timeout)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    def _get_timeout(self, service):
+        return _get_check_timeout(service) or self.lock_timeout
+
+    def _get_cache(self):
+        alias = getattr(settings, "HEALTH_CHECKS_SINGLE_FLIGHT_CACHE_ALIAS", None)
+        return caches[alias] if alias else None
+
+
+single_flight = SingleFlight()
+
+
+class Refresher(threading.Thread):
+    """Run the checks in the background, so requests can be answered with
+    the latest results that are stored in the :data:`result_cache`.
+
+    Each check configured in ``HEALTH_CHECKS_REFRESH_INTERVAL`` is refreshed
+    on its own interval. Checks that accept the ``request`` argument are
+    always executed during the request instead.
+
+    When the results are shared through ``HEALTH_CHECKS_CACHE_ALIAS``, each
+    check is refreshed by the process that holds its lease, the other
+    processes read the stored result.
+    """
+
+    max_wait = 1.0
+    lease_prefix = "healthchecks:lease:"
+
+    def __init__(self):
+        super().__init__(name="healthchecks-refresher", daemon=True)
+        self.pid = os.getpid()
+        self.owner = "%s:%d:%s" % (socket.gethostname(), self.pid, uuid.uuid4().hex)
+        self.stopped = threading.Event()
+        self._next_run = {}
+        self._leases = set()
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                # Like a request, don't keep using a broken connection.
+                close_old_connections()
+                try:
+                    wait = self.refresh()
+                finally:
+                    close_old_connections()
+                self.stopped.wait(wait)
+        finally:
+            self.release_leases()
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+
+    def refresh(self):
+        """Run the checks that are due, and tell how many seconds to wait
+        until the next check is due.
+        """
+        now = time.monotonic()
+        next_run = {}
+        due = []
+        for service, check_func in _get_refreshed_check_functions():
+            next_run[service] = self._next_run.get(service, now)
+            if next_run[service] <= now:
+                if self.acquire_lease(service):
+                    due.append((service, _logged_check_func(service, check_func)))
+                next_run[service] = now + _get_refresh_interval(service)
+        self._next_run = next_run
+
+        for service, value in _run_checks(due).items():
+            result_cache.set(service, CheckResult(value, time.time()))
+
+        waits = [at - time.monotonic() for at in next_run.values()]
+        return max(min(waits + [self.max_wait]), 0)
+
+    def acquire_lease(self, service):
+        """Tell whether this process should refresh the check. The lease is
+        taken or renewed for ``HEALTH_CHECKS_REFRESH_LEASE`` seconds, which
+        is twice the refresh interval by default.
+        """
+        cache = result_cache._get_cache()
+        if cache is None:
+            return True
+
+        key = self.lease_prefix + service
+        timeout = _get_refresh_lease(service)
+        if cache.add(key, self.owner, timeout):
+            self._leases.add(service)
+            return True
+        elif cache.get(key) == self.owner:
+            cache.touch(key, timeout)
+            return True
+
+        self._leases.discard(service)
+        return False
+
+    def release_leases(self):
+        """Give up the leases, so another process takes over right away."""
+        cache = result_cache._get_cache()
+        if cache is not None:
+            for service in self._leases:
+                key = self.lease_prefix + service
+                if cache.get(key) == self.owner:
+                    cache.delete(key)
+        self._leases.clear()
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def start_refresher():
+    """Start the background :class:`Refresher` of this process.
+
+    This is a no-op when ``HEALTH_CHECKS_REFRESH_INTERVAL`` isn't configured
+    or when the refresher is already running. The process id is compared
+    so a forked worker starts its own thread.
+    """
+    global _refresher
+
+    if not getattr(settings, "HEALTH_CHECKS_REFRESH_INTERVAL", None):
+        return
+
+    refresher = _refresher
+    if refresher is not None and refresher.pid == os.getpid():
+        if refresher.is_alive():
+            return refresher
+
+    with _refresher_lock:
+        if (
+            _refresher is None
+            or _refresher.pid != os.getpid()
+            or not _refresher.is_alive()
+        ):
+            _refresher = Refresher()
+            _refresher.start()
+    return _refresher
+
+
+@receiver(request_started)
+def start_refresher_on_request(**kwargs):
+    """Start the refresher in processes that serve requests, so it doesn't
+    run during management commands such as ``migrate``.
+    """
+    start_refresher()
+
+
+def stop_refresher():
+    """Stop the background :class:`Refresher`, if it's running."""
+    global _refresher
+
+    with _refresher_lock:
+        if _refresher is not None:
+            _refresher.stop()
+            _refresher = None
+
+
+def create_report(request=None, timings=None, group=None):
     """Run all checks and return a tuple containing results and boolean to
     indicate to indicate if all things are healthy.
 
+    :param timings: An optional dict, which is filled with the wall-clock
+        duration of each check in seconds.
+    :param group: Only run the checks of this group from the
+        ``HEALTH_CHECKS_GROUPS`` setting.
+    """
+    checks = list(_get_check_functions(request=request, group=group))
+    with _timing_checks(checks, timings) as checks:
+        report = _run_checks(checks, fail_fast=_get_fail_fast())
+    return report, _is_healthy(report)
+
+
+def create_service_result(service, request=None, timings=None):
+    check_func = _get_check_function(service, request=request)
+    if check_func is None:
+        return
+
+    with _timing_checks([(service, check_func)], timings) as checks:
+        return _run_checks(checks)[service]
+
+
+async def acreate_report(request=None, timings=None, group=None):
+    """Async version of :func:`create_report`.
+
+    Async checks are awaited together, other checks run in a thread.
+    """
+    checks = list(_get_check_functions(request=request, use_async=True, group=group))
+    with _timing_checks(checks, timings) as checks:
+        report = await _arun_checks(checks, fail_fast=_get_fail_fast())
+    return report, _is_healthy(report)
+
+
+async def acreate_service_result(service, request=None, timings=None):
+    """Async version of :func:`create_service_result`."""
+    check_func = _get_check_function(service, request=request, use_async=True)
+    if check_func is None:
+        return
+
+    with _timing_checks([(service, check_func)], timings) as checks:
+        report = await _arun_checks(checks)
+    return report[service]
+
+
+@contextlib.contextmanager
+def _timing_checks(checks, timings):
+    """Wrap the checks, so their wall-clock duration is stored in the
+    ``timings`` dict. Checks that didn't finish in time are given the
+    duration of the whole run.
+    """
+    if timings is None:
+        yield checks
+        return
+
+    start = time.perf_counter()
+    yield [
+        (service, _timed_check_func(service, check_func, timings))
+        for service, check_func in checks
+    ]
+    for service, _ in checks:
+        timings.setdefault(service, time.perf_counter() - start)
+
+
+def _timed_check_func(service, check_func, timings):
+    if asyncio.iscoroutinefunction(check_func):
+
+        async def handle_timed_async_check():
+            start = time.perf_counter()
+            try:
+                return await check_func()
+            finally:
+                timings[service] = time.perf_counter() - start
+
+        return handle_timed_async_check
+
+    def handle_timed_check():
+        start = time.perf_counter()
+        try:
+            return check_func()
+        finally:
+            timings[service] = time.perf_counter() - start
+
+    return handle_timed_check
+
+
+def _run_checks(checks, fail_fast=False):
+    """Run the ``(service, check_func)`` pairs and return a dict of results.
+
+    By default the checks run one after another. When
+    ``HEALTH_CHECKS_CONCURRENCY`` is larger than one, the checks are executed
+    in the :class:`CheckPool` so the total duration is roughly that of the
+    slowest check.
+
+    When there are multiple remote checks, these are all fired at once
+    (up to ``HEALTH_CHECKS_HTTP_CONCURRENCY``) and have to complete within
+    the single ``HEALTH_CHECKS_HTTP_TIMEOUT`` budget.
+
+    When ``HEALTH_CHECKS_TIMEOUT`` or ``HEALTH_CHECKS_REPORT_TIMEOUT`` are
+    configured, checks that miss their deadline are reported as ``False``
+    and the report is returned without waiting for them. Until such a run
+    has finished, the check is reported as ``False`` without running it again.
+
+    With ``fail_fast``, no more checks are awaited once a critical check
+    failed. The checks that were not awaited are reported as ``None``.
+    """
+    max_workers = max(min(_get_concurrency(), len(checks)), 1)
+    report_timeout = _get_report_timeout()
+    check_timeouts = {service: _get_check_timeout(service) for service, _ in checks}
+    has_timeouts = report_timeout is not None or any(
+        timeout is not None for timeout in check_timeouts.values()
+    )
+    remote_services = _get_fan_out_services(checks)
+    if max_workers == 1 and not has_timeouts and not remote_services:
+        results = {}
+        for service, check_func in checks:
+            results[service] = check_func() or False
+            if fail_fast and _is_critical_failure(service, results[service]):
+                break
+        return {service: results.get(service) for service, _ in checks}
+
+    start = time.monotonic()
+    report_deadline = None
+    if report_timeout is not None:
+        report_deadline = start + report_timeout
+    remote_deadline = start + _get_http_healthcheck_timeout()
+
+    # Remote checks have their own lane, so they're all started right away.
+    pending = {
+        False: collections.deque(
+            check for check in checks if check[0] not in remote_services
+        ),
+        True: collections.deque(
+            check for check in checks if check[0] in remote_services
+        ),
+    }
+    limits = {False: max_workers, True: max(_get_http_concurrency(), 1)}
+    pool = get_check_pool()
+    running = {}
+    results = {}
+
+    while pending[False] or pending[True] or running:
+        for remote, lane in pending.items():
+            while lane and _count_lane(running.values(), remote) < limits[remote]:
+                service, check_func = lane.popleft()
+                if timed_out_runs.is_running(service):
+                    # Don't pile up runs of a check that is still hanging.
+                    _log_timeout(service)
+                    results[service] = False
+                    continue
+
+                future = pool.submit(_reusing_connections(check_func))
+                running[future] = _RunningCheck(
+                    service,
+                    remote,
+                    _min_deadline(
+                        report_deadline,
+                        _add_timeout(time.monotonic(), check_timeouts[service]),
+                        remote_deadline if remote else None,
+                    ),
+                )
+
+        if running:
+            deadlines = [c.deadline for c in running.values() if c.deadline is not None]
+            wait = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+            done, _ = concurrent.futures.wait(
+                running, timeout=wait, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                results[running.pop(future).service] = future.result() or False
+
+        now = time.monotonic()
+        for future, check in list(running.items()):
+            if check.deadline is not None and check.deadline <= now:
+                _log_timeout(check.service)
+                timed_out_runs.add(check.service, future)
+                del running[future]
+                results[check.service] = False
+
+        if fail_fast and any(
+            _is_critical_failure(service, value) for service, value in results.items()
+        ):
+            return {service: results.get(service) for service, _ in checks}
+
+        if report_deadline is not None and report_deadline <= now:
+            for service, _ in pending[False] + pending[True]:
+                _log_timeout(service)
+            break
+
+        # Remote checks that didn't start within the budget are too late.
+        if remote_deadline <= now:
+            for service, _ in pending[True]:
+                _log_timeout(service)
+            pending[True].clear()
+
+    return {service: results.get(service, False) for service, _ in checks}
+
+
+async def _arun_checks(checks, fail_fast=False):
+    """Async version of :func:`_run_checks`, which awaits all checks at once.
+
+    The ``HEALTH_CHECKS_TIMEOUT`` and ``HEALTH_CHECKS_REPORT_TIMEOUT``
+    deadlines, the limits for remote checks and ``fail_fast`` are applied in
+    the same way. Checks that are not coroutine functions run in the
+    :class:`CheckPool`.
+    """
+    if not checks:
+        return {}
+
+    remote_services = _get_fan_out_services(checks)
+    semaphore = asyncio.Semaphore(max(_get_http_concurrency(), 1))
+    report_timeout = _get_report_timeout()
+    tasks = []
+    for service, check_func in checks:
+        if service in remote_services:
+            coroutine = _arun_check(
+                service,
+                check_func,
+                report_timeout,
+                semaphore,
+                _get_http_healthcheck_timeout(),
+            )
+        else:
+            coroutine = _arun_check(service, check_func, report_timeout)
+        tasks.append((service, asyncio.ensure_future(coroutine)))
+
+    # The checks apply the deadlines themselves.
+    services = {task: service for service, task in tasks}
+    return_when = asyncio.FIRST_COMPLETED if fail_fast else asyncio.ALL_COMPLETED
+    pending = set(services)
+    failed_fast = False
+    while pending and not failed_fast:
+        done, pending = await asyncio.wait(pending, return_when=return_when)
+        failed_fast = fail_fast and any(
+            not task.exception() and _is_critical_failure(services[task], task.result())
+            for task in done
+        )
+
+    results = {}
+    for service, task in tasks:
+        if task in pending:
+            task.cancel()
+            results[service] = None
+        else:
+            results[service] = task.result()
+    return results
+
+
+async def _arun_check(
+    service, check_func, report_timeout=None, semaphore=None, budget=None
+):
+    is_async = asyncio.iscoroutinefunction(check_func)
+    if not is_async and timed_out_runs.is_running(service):
+        # Don't pile up runs of a check that is still hanging.
+        _log_timeout(service)
+        return False
+
+    futures = []
+
+    async def call_check():
+        if is_async:
+            return await check_func()
+
+        # Like in the sync code path, other checks run in the CheckPool.
+        future = get_check_pool().submit(_reusing_connections(check_func))
+        futures.append(future)
+        return await asyncio.wrap_future(future)
+
+    async def call_limited_check():
+        async with semaphore:
+            return await call_check()
+
+    coroutine = call_check() if semaphore is None else call_limited_check()
+    timeout = _min_deadline(_get_check_timeout(service), budget, report_timeout)
+    try:
+        value = await asyncio.wait_for(coroutine, timeout)
+    except asyncio.TimeoutError:
+        _log_timeout(service)
+        for future in futures:
+            timed_out_runs.add(service, future)
+        return False
+    return value or False
+
+
+def _closing_connections(check_func):
+    """Close the database connections that the check opened in its thread,
+    for threads that exit once the check is done.
+    """
+
+    def handle_closing_connections():
+        try:
+            return check_func()
+        finally:
+            connections.close_all()
+
+    return handle_closing_connections
+
+
+def _reusing_connections(check_func):
+    """Close the database connections of a long-lived worker thread only when
+    they're unusable or past their ``CONN_MAX_AGE``, like Django does around
+    each request.
+    """
+
+    def handle_reusing_connections():
+        close_old_connections()
+        try:
+            return check_func()
+        finally:
+            close_old_connections()
+
+    return handle_reusing_connections
+
+
+def _min_deadline(*deadlines):
+    """Give the earliest deadline, ``None`` values are ignored."""
+    deadlines = [deadline for deadline in deadlines if deadline is not None]
+    return min(deadlines) if deadlines else None
+
+
+def _add_timeout(now, timeout):
+    return None if timeout is None else now + timeout
+
+
+def _count_lane(checks, remote):
+    return sum(1 for check in checks if check.remote == remote)
+
+
+def _get_fan_out_services(checks):
+    """Tell which checks are fired at once, as remote healthchecks.
+
+    A single remote check doesn't need a separate lane.
+    """
+    services = {service for service, _ in checks if _is_remote_check(service)}
+    return services if len(services) > 1 else set()
+
+
+def _is_remote_check(service):
+    check = get_registry().get(service)
+    return check is not None and check.is_remote
+
+
+_RunningCheck = collections.namedtuple(
+    "_RunningCheck", ["service", "remote", "deadline"]
+)
+
+
+class CheckPool(object):
+    """A bounded pool of long-lived threads that run the checks, shared by
+    all reports of the process.
+
+    Unlike a :class:`~concurrent.futures.ThreadPoolExecutor`, the workers are
+    daemon threads: a check that missed its deadline keeps running in the
+    background, and it should not block the process from shutting down.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.pid = os.getpid()
+        self._queue = queue.SimpleQueue()
+        self._workers = []
+        self._idle = threading.Semaphore(0)
+        self._lock = threading.Lock()
+
+    def submit(self, func):
+        """Schedule the function, and give a :class:`~concurrent.futures.Future`."""
+        future = _PoolFuture()
+        self._queue.put((future, func))
+        self._start_worker()
+        return future
+
+    def shutdown(self):
+        """Let the workers exit once they're idle."""
+        with self._lock:
+            for _ in self._workers:
+                self._queue.put(None)
+            self._workers = []
+
+    def _start_worker(self):
+        if self._idle.acquire(blocking=False):
+            return
+
+        with self._lock:
+            if len(self._workers) < self.size:
+                worker = threading.Thread(
+                    target=self._work,
+                    name="healthchecks-%d" % len(self._workers),
+                    daemon=True,
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            future, func = item
+            if future.set_running_or_notify_cancel():
+                token = _current_run.set(future)
+                try:
+                    future.set_result(func())
+                except Exception as e:
+                    future.set_exception(e)
+                finally:
+                    _current_run.reset(token)
+            self._idle.release()
+
+
+class _PoolFuture(concurrent.futures.Future):
+    """The future of a run in the :class:`CheckPool`."""
+
+    #: Whether the run missed its deadline, see :class:`TimedOutRuns`.
+    timed_out = False
+
+
+# The future of the run in the CheckPool that executes the current check.
+_current_run = contextvars.ContextVar("healthchecks_current_run", default=None)
+
+
+def _is_timed_out_run():
+    """Tell whether the current run of a check already missed its deadline."""
+    run = _current_run.get()
+    return run is not None and run.timed_out
+
+
+_check_pool = None
+_check_pool_lock = threading.Lock()
+
+
+def get_check_pool():
+    """Give the :class:`CheckPool` of this process.
+
+    The pool is recreated in a forked process, or when its size is changed.
+    """
+    global _check_pool
+
+    size = _get_thread_pool_size()
+    pool = _check_pool
+    if pool is not None and pool.pid == os.getpid() and pool.size == size:
+        return pool
+
+    with _check_pool_lock:
+        pool = _check_pool
+        if pool is None or pool.pid != os.getpid() or pool.size != size:
+            if pool is not None and pool.pid == os.getpid():
+                pool.shutdown()
+            pool = _check_pool = CheckPool(size)
+        return pool
+
+
+class TimedOutRuns(object):
+    """Track the runs of checks that missed their deadline, but didn't
+    finish yet.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def add(self, service, future):
+        # The timeout is tracked instead of the result of the run.
+        future.timed_out = True
+        if future.cancel():
+            # It didn't start yet, so it won't run at all.
+            return
+
+        with self._lock:
+            self._futures[service] = future
+        future.add_done_callback(functools.partial(self._discard, service))
+
+    def is_running(self, service):
+        future = self._futures.get(service)
+        return future is not None and not future.done()
+
+    def clear(self):
+        with self._lock:
+            self._futures.clear()
+
+    def _discard(self, service, future):
+        with self._lock:
+            if self._futures.get(service) is future:
+                del self._futures[service]
+
+
+timed_out_runs = TimedOutRuns()
+
+
+def _is_healthy(report):
+    """Tell whether all critical checks in the report succeeded."""
+    return all(value for service, value in report.items() if _is_critical(service))
+
+
+def _is_critical(service):
+    check = get_registry().get(service)
+    return check is None or check.critical
+
+
+def _is_critical_failure(service, value):
+    return not value and _is_critical(service)
+
+
+def _get_fail_fast():
+    return getattr(settings, "HEALTH_CHECKS_FAIL_FAST", False)
+
+
+def _get_concurrency():
+    return getattr(settings, "HEALTH_CHECKS_CONCURRENCY", 1)
+
+
+def _get_http_concurrency():
+    return getattr(settings, "HEALTH_CHECKS_HTTP_CONCURRENCY", 10)
+
+
+def _get_thread_pool_size():
+    size = getattr(settings, "HEALTH_CHECKS_THREAD_POOL_SIZE", None)
+    if size is None:
+        return max(_get_concurrency(), 1) + max(_get_http_concurrency(), 1)
+    return size
+
+
+def _get_check_timeout(service):
+    return _get_service_setting("HEALTH_CHECKS_TIMEOUT", service)
+
+
+def _get_report_timeout():
+    return getattr(settings, "HEALTH_CHECKS_REPORT_TIMEOUT", None)
+
+
+def _get_service_setting(setting_name, service, default=None):
+    """Read a setting that is either a single value, or a dict with a value
+    per service name (``"*"`` provides the fallback).
     """
-    report = {}
-    has_error = False
+    value = getattr(settings, setting_name, default)
+    if isinstance(value, dict):
+        return value.get(service, value.get("*", default))
+    return value
 
-    for service, check_func in _get_check_functions(request=request):
-        report[service] = check_func() or False
 
-        if not report[service]:
-            has_error = True
-    return report, not has_error
+def check_permission(service, request=None):
+    """Raise :class:`PermissionDenied` when the request has no access to the
+    service. This also works for endpoints that are not a registered check.
+    """
+    required_credentials = get_registry().get_required_credentials(service)
+    if required_credentials:
+        if _get_credentials_digest(request) not in required_credentials:
+            raise PermissionDenied()
 
 
-def create_service_result(service, request=None):
-    functions = list(_get_check_functions(name=service, request=request))
-    if not functions:
+def _get_check_functions(request=None, use_async=False, group=None):
+    registry = get_registry()
+    if group is not None:
+        registry = registry.get_group(group)
+    if not registry:
         return
 
-    check_func = functions[0][1]
-    result = check_func() or False
-    return result
+    checks = registry.filter_on_permission(request)
+    if not checks:
+        raise PermissionDenied()
+
+    for service, check in checks.items():
+        if check.refreshed:
+            start_refresher()
+        yield service, check.get_func(request, use_async=use_async)
 
 
-def _get_check_functions(name=None, request=None):
-    checks = _get_registered_health_checks()
-    if not checks or (name and name not in checks):
+def _get_check_function(service, request=None, use_async=False):
+    """Give the function of a single check, or ``None`` when it's unknown.
+
+    Only the credentials for this check are evaluated, so the cost doesn't
+    depend on the number of configured checks.
+    """
+    check = get_registry().get(service)
+    if check is None:
         return
 
-    checks = _filter_checks_on_permission(request, checks)
-    if not checks or (name and name not in checks):
+    if check.required_credentials and not check.is_allowed(
+        _get_credentials_digest(request)
+    ):
         raise PermissionDenied()
 
-    for service, func_string in checks.items():
-        if name and name != service:
-            continue
+    if check.refreshed:
+        start_refresher()
+    return check.get_func(request, use_async=use_async)
+
+
+def _get_refreshed_check_functions():
+    """Give the checks that are refreshed by the background :class:`Refresher`."""
+    for service, check in get_registry().items():
+        if check.refreshed:
+            yield service, check.check_func
+
+
+class RegisteredCheck(object):
+    """A check from the ``HEALTH_CHECKS`` setting, resolved once.
+
+    This holds the imported check function (wrapped for caching when
+    configured), whether it needs the request, and which basic auth
+    credentials are required to run it.
+    """
+
+    def __init__(self, service, func_string, required_credentials):
+        self.service = service
+        self.is_remote = isinstance(func_string, str) and func_string.startswith(
+            ("https://", "http://")
+        )
+        func, self.uses_request = _resolve_check_func(func_string)
+        self.is_async = asyncio.iscoroutinefunction(func)
+        func = _measured_check_func(service, func)
+        self.required_credentials = required_credentials
+        self.critical = _get_severity(service) == "critical"
+        self.refreshed = bool(not self.uses_request and _get_refresh_interval(service))
 
-        if callable(func_string):
-            check_func = func_string
-        elif func_string.startswith(("https://", "http://")):
-            check_func = _http_healthcheck_func(func_string)
+        # The plain synchronous check, as used by the background refresher.
+        self.check_func = async_to_sync(func) if self.is_async else func
+        if not self.uses_request and _get_single_flight(service):
+            # Results that depend on the request can't be shared.
+            self.check_func = _single_flight_check_func(service, self.check_func)
+            func = _single_flight_check_func(service, func)
+        if _get_circuit_breaker_threshold(service):
+            self.check_func = _circuit_breaker_check_func(service, self.check_func)
+            func = _circuit_breaker_check_func(service, func)
+
+        if self.uses_request:
+            # Checks that depend on the request can't be cached.
+            self.sync_func = self.async_func = func
+        elif self.refreshed:
+            self.sync_func = _snapshot_check_func(service, self.check_func)
+            self.async_func = self.sync_func
+        elif _get_cache_ttl(service) is not None:
+            self.sync_func = _cached_check_func(service, self.check_func)
+            self.async_func = self.sync_func
         else:
-            check_func = import_string(func_string)
+            self.sync_func = self.check_func
+            self.async_func = func
+
+    def get_func(self, request=None, use_async=False):
+        """Give the function to call, async checks are only awaited directly
+        in the async code path.
+        """
+        func = self.async_func if use_async else self.sync_func
+        if self.uses_request:
+            if self.is_async and not use_async:
+                func = self.check_func
+            return functools.partial(func, request)
+        return func
+
+    def is_allowed(self, credentials_digest):
+        """Tell whether the credentials give access to this check.
+
+        :param credentials_digest: The hashed basic auth credentials of the
+            request, as given by :func:`_get_credentials_digest`.
+        """
+        if not self.required_credentials:
+            return True
+        return (
+            credentials_digest is not None
+            and credentials_digest in self.required_credentials
+        )
+
+
+class CheckRegistry(collections.OrderedDict):
+    """All configured checks, by service name.
+
+    The registry is built once, and rebuilt when one of the
+    ``HEALTH_CHECKS*`` settings is changed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compiled_credentials = {}
+        self.groups = {}
+
+    @classmethod
+    def from_settings(cls):
+        registry = cls()
+        for service, func_string in _get_registered_health_checks().items():
+            registry[service] = RegisteredCheck(
+                service, func_string, registry.get_required_credentials(service)
+            )
+
+        for group, services in _get_check_groups().items():
+            unknown = [service for service in services if service not in registry]
+            if unknown:
+                raise ImproperlyConfigured(
+                    "HEALTH_CHECKS_GROUPS[%r] refers to unknown checks: %s"
+                    % (group, ", ".join(unknown))
+                )
+            registry.groups[group] = tuple(services)
+        return registry
+
+    def get_group(self, group):
+        """Give the checks of a group, as a new registry.
+
+        :raises KeyError: When the group is not configured.
+        """
+        return CheckRegistry((service, self[service]) for service in self.groups[group])
+
+    def get_required_credentials(self, service):
+        """Give the compiled credentials that give access to a service.
+
+        Services without their own entry in ``HEALTH_CHECKS_BASIC_AUTH``
+        share the credentials of the ``"*"`` entry.
+        """
+        permissions = getattr(settings, "HEALTH_CHECKS_BASIC_AUTH", {})
+        key = service if service in permissions else "*"
+        if key not in self._compiled_credentials:
+            self._compiled_credentials[key] = _compile_credentials(permissions.get(key))
+        return self._compiled_credentials[key]
+
+    def filter_on_permission(self, request):
+        """Give the checks that the request has access to."""
+        digest = None
+        if any(check.required_credentials for check in self.values()):
+            digest = _get_credentials_digest(request)
+
+        return collections.OrderedDict(
+            (service, check)
+            for service, check in self.items()
+            if check.is_allowed(digest)
+        )
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Give the :class:`CheckRegistry`, it's built on the first call."""
+    global _registry
+
+    registry = _registry
+    if registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CheckRegistry.from_settings()
+            registry = _registry
+    return registry
+
+
+@receiver(setting_changed)
+def reset_registry(setting, **kwargs):
+    """Rebuild the registry when the settings are changed (e.g. in tests)."""
+    global _registry
+
+    if setting.startswith("HEALTH_CHECKS"):
+        with _registry_lock:
+            _registry = None
 
-        spec = inspect.getfullargspec(check_func)
-        if spec.args == ["request"]:
-            check_func = functools.partial(check_func, request)
 
-        yield service, check_func
+def _resolve_check_func(func_string):
+    """Give the check function, and tell whether it needs the request."""
+    if callable(func_string):
+        check_func = func_string
+    elif func_string.startswith(("https://", "http://")):
+        check_func = _http_healthcheck_func(func_string)
+    else:
+        check_func = import_string(func_string)
+
+    spec = inspect.getfullargspec(check_func)
+    return check_func, spec.args == ["request"]
+
+
+def _snapshot_check_func(service, check_func):
+    """Wrap the check so the result of the background refresher is used.
+
+    The check only runs during the request when no result is available yet.
+    """
+
+    def handle_snapshot_check():
+        result = result_cache.get(service)
+        if result is not None:
+            return result.value
+
+        value = check_func() or False
+        result_cache.set(service, CheckResult(value, time.time()))
+        return value
+
+    return handle_snapshot_check
+
+
+def _measured_check_func(service, check_func):
+    """Wrap the check so every run is tracked in the :data:`check_metrics`,
+    and the :data:`~django_healthchecks.signals.check_finished` signal is sent.
+
+    Results that are served from the cache are not runs, so they're not
+    measured.
+    """
+    if asyncio.iscoroutinefunction(check_func):
+
+        async def handle_measured_async_check(*args):
+            start = time.perf_counter()
+            try:
+                value = await check_func(*args)
+            except asyncio.CancelledError:
+                # The check missed its deadline, which is tracked as a timeout.
+                raise
+            except Exception as e:
+                _finish_check(service, None, time.perf_counter() - start, e)
+                raise
+            _finish_check(service, value, time.perf_counter() - start, None)
+            return value
+
+        return handle_measured_async_check
+
+    def handle_measured_check(*args):
+        start = time.perf_counter()
+        value = exception = None
+        try:
+            value = check_func(*args)
+            return value
+        except Exception as e:
+            exception = e
+            raise
+        finally:
+            _finish_check(service, value, time.perf_counter() - start, exception)
+
+    return handle_measured_check
+
+
+def _finish_check(service, value, duration, exception):
+    # A run that missed its deadline was already tracked as a timeout.
+    if not _is_timed_out_run():
+        check_metrics.record(service, value, duration)
+        if _get_circuit_breaker_threshold(service):
+            circuit_breaker.record(service, value)
+    check_finished.send_robust(
+        sender=service,
+        service=service,
+        duration=duration,
+        result=value,
+        exception=exception,
+    )
+
+
+def _single_flight_check_func(service, check_func):
+    """Wrap the check so concurrent calls share a single run,
+    see :class:`SingleFlight`.
+    """
+    if asyncio.iscoroutinefunction(check_func):
+
+        async def handle_single_flight_async_check():
+            return await single_flight.arun(service, check_func)
+
+        return handle_single_flight_async_check
+
+    def handle_single_flight_check():
+        return single_flight.run(service, check_func)
+
+    return handle_single_flight_check
+
+
+def _get_single_flight(service):
+    return _get_service_setting("HEALTH_CHECKS_SINGLE_FLIGHT", service, True)
+
+
+def _circuit_breaker_check_func(service, check_func):
+    """Wrap the check so it's reported as failed while its circuit is open,
+    see :class:`CircuitBreaker`. The outcome of each run is tracked by
+    :func:`_measured_check_func`.
+    """
+    if asyncio.iscoroutinefunction(check_func):
+
+        async def handle_circuit_breaker_async_check(*args):
+            if not circuit_breaker.allow(service):
+                return False
+            return await check_func(*args)
+
+        return handle_circuit_breaker_async_check
+
+    def handle_circuit_breaker_check(*args):
+        if not circuit_breaker.allow(service):
+            return False
+        return check_func(*args)
+
+    return handle_circuit_breaker_check
+
+
+def _get_circuit_breaker_threshold(service):
+    return _get_service_setting("HEALTH_CHECKS_CIRCUIT_BREAKER_THRESHOLD", service)
+
+
+def _get_circuit_breaker_cooldown(service):
+    return _get_service_setting("HEALTH_CHECKS_CIRCUIT_BREAKER_COOLDOWN", service, 30)
+
+
+def _log_timeout(service):
+    logger.warning("Healthcheck %r timed out", service)
+    check_metrics.record_timeout(service)
+    if _get_circuit_breaker_threshold(service):
+        circuit_breaker.record(service, False)
+
+
+def _logged_check_func(service, check_func):
+    """Wrap the check so exceptions are logged and reported as failures."""
+
+    def handle_logged_check():
+        try:
+            return check_func()
+        except Exception:
+            logger.exception("Healthcheck %r failed", service)
+            return False
+
+    return handle_logged_check
+
+
+def _get_refresh_interval(service):
+    return _get_service_setting("HEALTH_CHECKS_REFRESH_INTERVAL", service)
+
+
+def _get_refresh_lease(service):
+    lease = _get_service_setting("HEALTH_CHECKS_REFRESH_LEASE", service)
+    if lease is None:
+        return 2 * _get_refresh_interval(service)
+    return lease
+
+
+def _cached_check_func(service, check_func):
+    """Wrap the check so its result is reused until the TTL has passed.
+
+    When ``HEALTH_CHECKS_CACHE_MAX_STALE`` is configured, an expired result
+    is still returned for that many seconds, while it's refreshed in the
+    background.
+    """
+
+    def run_check():
+        value = check_func() or False
+        timeout = _get_cache_timeout(service, value)
+        result_cache.set(service, CheckResult(value, time.time()), timeout)
+        return value
+
+    def handle_cached_check():
+        result = result_cache.get(service)
+        if result is not None:
+            age = time.time() - result.checked_at
+            ttl = _get_cache_ttl(service, result.value)
+            if age < ttl:
+                return result.value
+
+            max_stale = _get_cache_max_stale(service)
+            if max_stale is not None and age < ttl + max_stale:
+                _revalidate(service, run_check)
+                return result.value
+
+        return run_check()
+
+    return handle_cached_check
+
+
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def _revalidate(service, run_check):
+    """Refresh a stale result in a background thread, at most one at a time
+    for each check.
+    """
+    with _revalidating_lock:
+        if service in _revalidating:
+            return
+        _revalidating.add(service)
+
+    def handle_revalidate():
+        try:
+            _logged_check_func(service, _closing_connections(run_check))()
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(service)
+
+    thread = threading.Thread(
+        target=handle_revalidate, name="healthchecks-revalidate", daemon=True
+    )
+    thread.start()
+
+
+def is_stale(service, result):
+    """Tell whether the stored :class:`CheckResult` is older than its TTL,
+    which happens when stale results are served while they're refreshed.
+    """
+    ttl = _get_cache_ttl(service, result.value)
+    return ttl is not None and time.time() - result.checked_at >= ttl
+
+
+def _get_cache_timeout(service, value):
+    """Tell how long a result should be stored, including the time that it
+    may be served while it's stale.
+    """
+    ttl = _get_cache_ttl(service, value)
+    max_stale = _get_cache_max_stale(service)
+    if max_stale is not None:
+        return ttl + max_stale
+    return ttl
+
+
+def _get_cache_max_stale(service):
+    return _get_service_setting("HEALTH_CHECKS_CACHE_MAX_STALE", service)
+
+
+def _get_cache_ttl(service, value=True):
+    """Tell how many seconds a result may be cached.
+
+    Failures use ``HEALTH_CHECKS_CACHE_FAILURE_TTL`` when it's configured.
+    """
+    ttl = _get_service_setting("HEALTH_CHECKS_CACHE_TTL", service)
+    if not value:
+        ttl = _get_service_setting("HEALTH_CHECKS_CACHE_FAILURE_TTL", service, ttl)
+    return ttl
 
 
 def _get_registered_health_checks():
     return getattr(settings, "HEALTH_CHECKS", {})
 
 
+def _get_severity(service):
+    severity = _get_service_setting("HEALTH_CHECKS_SEVERITY", service, "critical")
+    if severity not in ("critical", "warning"):
+        raise ImproperlyConfigured(
+            "HEALTH_CHECKS_SEVERITY for %r should be 'critical' or 'warning', not %r"
+            % (service, severity)
+        )
+    return severity
+
+
+def _get_check_groups():
+    return getattr(settings, "HEALTH_CHECKS_GROUPS", {"liveness": []})
+
+
 def _http_healthcheck_func(url):
     def handle_remote_request():
         try:
-            response = requests.get(url, timeout=_get_http_healthcheck_timeout())
+            response = get_http_session().get(
+                url, timeout=_get_http_healthcheck_timeout()
+            )
         except requests.exceptions.RequestException:
             return False
 
@@ -87,22 +1613,80 @@ def _get_http_healthcheck_timeout():
     return getattr(settings, "HEALTH_CHECKS_HTTP_TIMEOUT", 0.5)
 
 
-def _filter_checks_on_permission(request, checks):
-    permissions = getattr(settings, "HEALTH_CHECKS_BASIC_AUTH", {})
-    if not permissions:
-        return checks
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Give the :class:`requests.Session` that is shared by all remote checks.
 
-    allowed = {}
-    for name in checks.keys():
-        required_credentials = permissions.get(name, permissions.get("*"))
+    The connections are kept alive between reports, so each probe doesn't
+    open a new TCP and TLS connection to every remote service. Cookies are
+    not stored, so a response of one service doesn't affect later requests.
+    The session is recreated when the pool settings change.
+    """
+    global _http_session
+
+    config = (
+        getattr(settings, "HEALTH_CHECKS_HTTP_POOL_SIZE", 10),
+        getattr(settings, "HEALTH_CHECKS_HTTP_RETRIES", 0),
+    )
+    session = _http_session
+    if session is not None and session.healthchecks_config == config:
+        return session
+
+    with _http_session_lock:
+        if _http_session is None or _http_session.healthchecks_config != config:
+            pool_size, retries = config
+            adapter = HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            # No domain is allowed, so all cookies are rejected.
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.healthchecks_config = config
+            _http_session = session
+        return _http_session
+
+
+def _compile_credentials(required_credentials):
+    """Turn the configured ``(username, password)`` pairs into a set of
+    hashes, so a lookup doesn't depend on the number of credentials.
+    """
+    if not required_credentials:
+        return None
+    return frozenset(
+        _hash_credentials(":".join(credentials)) for credentials in required_credentials
+    )
+
+
+def _hash_credentials(credentials):
+    # Only fixed-size digests are compared, which doesn't leak the length or
+    # the contents of the configured passwords through timing differences.
+    return hashlib.sha256(credentials.encode("utf-8")).digest()
+
+
+def _get_credentials_digest(request):
+    """Give the hashed basic auth credentials of the request.
+
+    The result is memoized on the request, so the header is only decoded once.
+    """
+    if request is None:
+        return None
 
-        if required_credentials:
-            credentials = _get_basic_auth(request)
-            if not credentials or credentials not in required_credentials:
-                continue
+    try:
+        return request._healthchecks_credentials_digest
+    except AttributeError:
+        pass
 
-        allowed[name] = checks[name]
-    return allowed
+    digest = None
+    credentials = _get_basic_auth(request)
+    if credentials:
+        digest = _hash_credentials(":".join(credentials))
+    request._healthchecks_credentials_digest = digest
+    return digest
 
 
 def _get_basic_auth(request):
@@ -4,11 +4,39 @@ This module exists to keep external code decoupled from our model-based
 implementation. This allows extending the functionality later to support
 different mechanisms for tracking heartbeats (e.g. external services).
 """
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
 from functools import wraps
 
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
 from django.utils.timezone import now
 
-from django_healthchecks.models import HeartbeatMonitor
+logger = logging.getLogger(__name__)
+_backends = {}
+
+
+def get_backend():
+    """Give the heartbeat backend, configured by
+    ``HEALTHCHECKS_HEARTBEAT_BACKEND``.
+
+    :rtype: django_healthchecks.backends.BaseHeartbeatBackend
+    """
+    path = getattr(
+        settings,
+        "HEALTHCHECKS_HEARTBEAT_BACKEND",
+        "django_healthchecks.backends.ModelBackend",
+    )
+    backend = _backends.get(path)
+    if backend is None:
+        backend = _backends[path] = import_string(path)()
+    return backend
 
 
 def get_expired_heartbeats():
@@ -16,7 +44,7 @@ def get_expired_heartbeats():
 
     :rtype: list
     """
-    return HeartbeatMonitor.objects.enabled().expired_names()
+    return get_backend().get_expired_heartbeats()
 
 
 def get_heartbeat_statuses():
@@ -24,9 +52,35 @@ def get_heartbeat_statuses():
 
     :rtype: dict
     """
-    data = HeartbeatMonitor.objects.enabled().status_by_name()
-    data["__all__"] = all(data.values())
-    return data
+    return get_backend().get_heartbeat_statuses()
+
+
+def iter_heartbeat_statuses(prefix=None, after=None, limit=None):
+    """Iterate over ``(name, status)`` for every heartbeat, ordered by name.
+
+    Unlike :func:`get_heartbeat_statuses`, the heartbeats are fetched in
+    chunks, which keeps the memory usage flat for large tables.
+
+    :param prefix: Only include the names that start with this prefix.
+    :type prefix: str
+    :param after: Only include the names that sort after this name.
+    :type after: str
+    :param limit: The maximum number of heartbeats to give.
+    :type limit: int
+    :rtype: iterator
+    """
+    return get_backend().iter_heartbeat_statuses(
+        prefix=prefix, after=after, limit=limit
+    )
+
+
+def iter_heartbeat_expiry(prefix=None, after=None, limit=None):
+    """Iterate over ``(name, expires_at)`` for every heartbeat, ordered by
+    name. The parameters are the same as :func:`iter_heartbeat_statuses`.
+
+    :rtype: iterator
+    """
+    return get_backend().iter_heartbeat_expiry(prefix=prefix, after=after, limit=limit)
 
 
 def update_heartbeat(name, default_timeout=None, timeout=None):
@@ -44,11 +98,55 @@ def update_heartbeat(name, default_timeout=None, timeout=None):
     :param timeout: The timeout to be forcefully updated.
     :type timeout: datetime.timedelta
     """
-    HeartbeatMonitor._update(
-        name=name, default_timeout=default_timeout, timeout=timeout
+    if not _coalescer.filter([name], default_timeout, timeout):
+        return
+
+    if _get_buffer_interval():
+        _buffer.add([name], default_timeout=default_timeout, timeout=timeout)
+        return
+
+    get_backend().update_heartbeat(
+        name, default_timeout=default_timeout, timeout=timeout
     )
 
 
+def update_heartbeats(names, default_timeout=None, timeout=None):
+    """Update multiple heartbeat monitors at once.
+
+    This works like :func:`update_heartbeat`, but writes all heartbeats
+    with a few bulk queries.
+
+    :param names: Names of the checks.
+    :type names: list
+    :param default_timeout: The timeout to use by default on registration.
+    :type default_timeout: datetime.timedelta
+    :param timeout: The timeout to be forcefully updated.
+    :type timeout: datetime.timedelta
+    """
+    names = _coalescer.filter(names, default_timeout, timeout)
+    if not names:
+        return
+
+    if _get_buffer_interval():
+        _buffer.add(names, default_timeout=default_timeout, timeout=timeout)
+        return
+
+    last_beat = now()
+    get_backend().update_heartbeats(
+        {name: (last_beat, default_timeout, timeout) for name in names}
+    )
+
+
+def flush_heartbeats():
+    """Write the buffered heartbeats to the database, including the beats that
+    are held back by the ``HEALTHCHECKS_HEARTBEAT_MIN_INTERVAL``.
+
+    This happens automatically every ``HEALTHCHECKS_HEARTBEAT_BUFFER_INTERVAL``
+    seconds, and when the process exits.
+    """
+    _buffer.flush()
+
+
 def update_heartbeat_on_success(name, default_timeout=None, timeout=None):
     """Decorator to update a heartbeat when a function was successful.
 
@@ -71,3 +169,202 @@ def update_heartbeat_on_success(name, default_timeout=None, timeout=None):
         return _update_heartbeat_decorator
 
     return _inner
+
+
+class HeartbeatBuffer(object):
+    """Collect heartbeats in memory, and write them in bulk.
+
+    Multiple beats for the same name are merged, so only the latest beat is
+    written. A background thread flushes the buffer every
+    ``HEALTHCHECKS_HEARTBEAT_BUFFER_INTERVAL`` seconds. It also writes the
+    beats that the :class:`WriteCoalescer` held back, once their interval
+    has passed.
+    """
+
+    def __init__(self):
+        self._beats = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def add(self, names, default_timeout=None, timeout=None):
+        beat = (now(), default_timeout, timeout)
+        with self._lock:
+            for name in names:
+                self._beats[name] = _merge_beats(self._beats.get(name), beat)
+        self.start()
+
+    def flush(self, include_held=True):
+        """Write the buffered beats.
+
+        :param include_held: Also write the held back beats of which the
+            interval didn't pass yet.
+        """
+        with self._lock:
+            beats, self._beats = self._beats, {}
+        for name, beat in _coalescer.release(force=include_held).items():
+            beats[name] = _merge_beats(beats.get(name), beat)
+        if not beats:
+            return
+
+        try:
+            get_backend().update_heartbeats(beats)
+        except Exception:
+            # Keep them for the next attempt, merged with newer beats.
+            with self._lock:
+                for name, beat in beats.items():
+                    self._beats[name] = _merge_beats(beat, self._beats.get(name))
+            raise
+
+    def flush_quietly(self, include_held=True):
+        """Flush, but only log errors (for the background thread and exit)."""
+        try:
+            self.flush(include_held=include_held)
+        except Exception:
+            logger.exception("Failed to write the buffered heartbeats")
+
+    def clear(self):
+        """Forget the buffered beats, and stop the thread."""
+        with self._lock:
+            self._stopped.set()
+            self._beats = {}
+            self._thread = None
+
+    def start(self):
+        """Start the background thread, unless it's running already."""
+        thread = self._thread
+        if thread is not None and thread.pid == os.getpid() and thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is None or self._thread.pid != os.getpid():
+                self._stopped = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(self._stopped,),
+                    name="healthchecks-heartbeats",
+                    daemon=True,
+                )
+                self._thread.pid = os.getpid()
+                self._thread.start()
+
+    def _run(self, stopped):
+        while not stopped.wait(_get_buffer_interval() or 1):
+            try:
+                self.flush_quietly(include_held=False)
+            finally:
+                connections.close_all()
+
+
+class WriteCoalescer(object):
+    """Hold back heartbeats that follow shortly after the previous write.
+
+    The minimum interval between writes for the same name is configured by
+    ``HEALTHCHECKS_HEARTBEAT_MIN_INTERVAL``. This is either a ``timedelta``,
+    or a fraction of the heartbeat timeout. A fraction only applies once the
+    stored timeout is known, because it was written with ``timeout``.
+
+    The latest beat that is held back is written by the
+    :class:`HeartbeatBuffer` once the interval has passed. So as long as the
+    interval is shorter than the timeout, a monitor doesn't expire earlier
+    than it would otherwise. Beats that carry a ``timeout`` are always
+    written right away.
+    """
+
+    def __init__(self):
+        self._written = {}
+        self._timeouts = {}
+        self._held = {}
+        self._lock = threading.Lock()
+
+    def filter(self, names, default_timeout=None, timeout=None):
+        """Give the names that should be written now, the other beats are
+        held back.
+        """
+        if not getattr(settings, "HEALTHCHECKS_HEARTBEAT_MIN_INTERVAL", None):
+            return list(names)
+
+        t = time.monotonic()
+        beat = (now(), default_timeout, None)
+        due = []
+        with self._lock:
+            for name in names:
+                if timeout is not None or self._is_due(name, t):
+                    due.append(name)
+                    # The new beat replaces the beat that is held back.
+                    self._held.pop(name, None)
+                    self._written[name] = t
+                    if timeout is not None:
+                        self._timeouts[name] = timeout
+                else:
+                    self._held[name] = _merge_beats(self._held.get(name), beat)
+            is_holding = bool(self._held)
+
+        if is_holding:
+            _buffer.start()
+        return due
+
+    def release(self, force=False):
+        """Give the held back beats of which the interval has passed, as a
+        dict of ``name: (last_beat, default_timeout, timeout)``.
+
+        :param force: Give all held back beats.
+        """
+        t = time.monotonic()
+        with self._lock:
+            names = [name for name in self._held if force or self._is_due(name, t)]
+            for name in names:
+                self._written[name] = t
+            return {name: self._held.pop(name) for name in names}
+
+    def clear(self):
+        with self._lock:
+            self._written = {}
+            self._timeouts = {}
+            self._held = {}
+
+    def _is_due(self, name, t):
+        interval = _get_min_interval(self._timeouts.get(name))
+        return (
+            not interval
+            or name not in self._written
+            or self._written[name] + interval <= t
+        )
+
+
+def _merge_beats(older, newer):
+    """Merge two ``(last_beat, default_timeout, timeout)`` beats.
+
+    The first default timeout is used on registration, and the latest
+    forced timeout wins.
+    """
+    if older is None:
+        return newer
+    if newer is None:
+        return older
+    return (
+        max(older[0], newer[0]),
+        older[1] or newer[1],
+        newer[2] if newer[2] is not None else older[2],
+    )
+
+
+_buffer = HeartbeatBuffer()
+atexit.register(_buffer.flush_quietly)
+_coalescer = WriteCoalescer()
+
+
+def _get_buffer_interval():
+    return getattr(settings, "HEALTHCHECKS_HEARTBEAT_BUFFER_INTERVAL", None)
+
+
+def _get_min_interval(timeout=None):
+    """Tell the minimum number of seconds between writes of a heartbeat,
+    given its stored timeout (if known).
+    """
+    interval = getattr(settings, "HEALTHCHECKS_HEARTBEAT_MIN_INTERVAL", None)
+    if isinstance(interval, timedelta):
+        return interval.total_seconds()
+    if interval and timeout is not None:
+        return timeout.total_seconds() * interval
+    return None
@@ -0,0 +1,106 @@
+"""Expose the check results in the Prometheus text format.
+
+The metrics are read from the stored results and the heartbeat monitors,
+so a scrape doesn't run the checks.
+"""
+
+from django.apps import apps
+from django.utils.timezone import now
+
+from django_healthchecks.checker import check_metrics, get_registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+CHECK_METRICS = (
+    (
+        "healthchecks_check_status",
+        "gauge",
+        "Whether the last run of the check was healthy, 0 when it timed out.",
+        lambda metric: None if metric.healthy is None else int(metric.healthy),
+    ),
+    (
+        "healthchecks_check_duration_seconds",
+        "gauge",
+        "The duration of the last run of the check, unless it timed out.",
+        lambda metric: metric.duration,
+    ),
+    (
+        "healthchecks_check_last_run_timestamp_seconds",
+        "gauge",
+        "When the check last finished or timed out, in seconds since the epoch.",
+        lambda metric: metric.checked_at,
+    ),
+    (
+        "healthchecks_check_runs_total",
+        "counter",
+        "The number of times the check was run.",
+        lambda metric: metric.runs,
+    ),
+    (
+        "healthchecks_check_failures_total",
+        "counter",
+        "The number of runs that failed or raised an exception.",
+        lambda metric: metric.failures,
+    ),
+    (
+        "healthchecks_check_timeouts_total",
+        "counter",
+        "The number of times the check missed its deadline.",
+        lambda metric: metric.timeouts,
+    ),
+)
+
+
+def iter_metrics():
+    """Generate the metrics in the text exposition format, in chunks."""
+    metrics = check_metrics.get_many(get_registry().keys())
+    for name, metric_type, help_text, get_value in CHECK_METRICS:
+        lines = _get_header(name, metric_type, help_text)
+        for service, metric in metrics.items():
+            value = get_value(metric)
+            if value is not None:
+                lines.append(_get_sample(name, {"service": service}, value))
+        yield "".join(lines)
+
+    if apps.is_installed("django_healthchecks"):
+        yield from _iter_heartbeat_metrics()
+
+
+def _iter_heartbeat_metrics(batch_size=1000):
+    from django_healthchecks.heartbeats import iter_heartbeat_expiry
+
+    name = "healthchecks_heartbeat_remaining_seconds"
+    lines = _get_header(
+        name, "gauge", "The time until the heartbeat expires, negative if expired."
+    )
+    t = now()
+    for monitor, expires_at in iter_heartbeat_expiry():
+        if expires_at is None:
+            continue
+
+        remaining = (expires_at - t).total_seconds()
+        lines.append(_get_sample(name, {"name": monitor}, remaining))
+        if len(lines) >= batch_size:
+            yield "".join(lines)
+            lines = []
+
+    yield "".join(lines)
+
+
+def _get_header(name, metric_type, help_text):
+    return [
+        "# HELP %s %s\n" % (name, help_text),
+        "# TYPE %s %s\n" % (name, metric_type),
+    ]
+
+
+def _get_sample(name, labels, value):
+    label_str = ",".join(
+        '%s="%s"' % (key, _escape_label_value(label_value))
+        for key, label_value in labels.items()
+    )
+    return "%s{%s} %s\n" % (name, label_str, value)
+
+
+def _escape_label_value(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
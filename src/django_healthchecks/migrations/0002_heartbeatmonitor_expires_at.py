@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_expires_at(apps, schema_editor):
+    HeartbeatMonitor = apps.get_model("django_healthchecks", "HeartbeatMonitor")
+    HeartbeatMonitor.objects.using(schema_editor.connection.alias).filter(
+        last_beat__isnull=False
+    ).update(expires_at=F("last_beat") + F("timeout"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_healthchecks", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="heartbeatmonitor",
+            name="expires_at",
+            field=models.DateTimeField(
+                db_index=True, editable=False, null=True, verbose_name="Expires at"
+            ),
+        ),
+        migrations.RunPython(fill_expires_at, migrations.RunPython.noop),
+    ]
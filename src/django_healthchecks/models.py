@@ -1,8 +1,8 @@
 from datetime import timedelta
 
 from django.conf import settings
-from django.db import models
-from django.db.models import ExpressionWrapper, F
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Case, F, Value, When
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
@@ -22,29 +22,51 @@ class HeartbeatMonitorQuerySet(models.QuerySet):
         return self.filter(enabled=True)
 
     def annotate_expires_at(self):
-        """Add an ``expires_at`` field to the queryset results."""
-        return self.annotate(
-            expires_at=ExpressionWrapper(
-                (F("last_beat") + F("timeout")), output_field=EXPIRES_COLUMN_TYPE
-            )
-        )
+        """Kept for backwards compatibility, the ``expires_at`` field is
+        stored in the database now.
+        """
+        return self
+
+    def filter_names(self, prefix=None, after=None):
+        """Filter on a name prefix, and on the names that sort after a given
+        name. This allows keyset pagination on the unique ``name`` index.
+        """
+        queryset = self.order_by("name")
+        if prefix:
+            queryset = queryset.filter(name__startswith=prefix)
+        if after is not None:
+            queryset = queryset.filter(name__gt=after)
+        return queryset
 
     def expired(self):
         """Tell which services no longer appear to send heartbeats."""
-        return self.annotate_expires_at().filter(expires_at__lt=now())
+        return self.filter(expires_at__lt=now())
 
     def expired_names(self):
         """Return a list of all heartbeats names that are expired."""
         return list(self.expired().values_list("name", flat=True))
 
+    def annotate_is_expired(self):
+        """Add an ``is_expired`` field, that is calculated by the database."""
+        # A CASE expression works for all vendors, including those that
+        # don't support boolean comparisons in the SELECT clause (Oracle).
+        return self.annotate(
+            is_expired=Case(
+                When(expires_at__lt=now(), then=Value(True)),
+                default=Value(False),
+                output_field=IS_EXPIRED_COLUMN_TYPE,
+            )
+        )
+
     def status_by_name(self):
         """Return the expired status for every heartbeat."""
-        # Sadly, tests like (F('last_beat') + F('timeout')) < now() aren't supported in Django.
-        # Even this fails: .annotate(is_expired=RawSQL("(last_beat + timeout) < %s", [now()]))
-        # Thus, have to make the comparison in Python instead.
-        t = now()
-        monitors = self.annotate_expires_at().values_list("name", "expires_at")
-        return {name: (expires_at < t) for name, expires_at in monitors}
+        return dict(self.annotate_is_expired().values_list("name", "is_expired"))
+
+    def all_healthy(self):
+        """Tell whether none of the heartbeats expired, using a single
+        ``EXISTS`` query. Use this when the statuses themselves are not needed.
+        """
+        return not self.expired().exists()
 
 
 class HeartbeatMonitor(models.Model):
@@ -58,6 +80,10 @@ class HeartbeatMonitor(models.Model):
     enabled = models.BooleanField(_("Enabled"), db_index=True, default=True)
     timeout = models.DurationField(_("Timeout"))
     last_beat = models.DateTimeField(_("Last Beat"), null=True)
+    # Stored, so expired heartbeats can be found with an index range scan.
+    expires_at = models.DateTimeField(
+        _("Expires at"), null=True, db_index=True, editable=False
+    )
 
     objects = HeartbeatMonitorQuerySet.as_manager()
 
@@ -69,15 +95,23 @@ class HeartbeatMonitor(models.Model):
         verbose_name = _("Heartbeat Monitor")
         verbose_name_plural = _("Heartbeat Monitors")
 
-    @property
-    def expires_at(self):
-        """Tell when the object will expire"""
+    def save(self, *args, **kwargs):
+        self.expires_at = self.calculate_expires_at()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"last_beat", "timeout"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"expires_at"}
+        super().save(*args, **kwargs)
+
+    def calculate_expires_at(self):
+        """Tell when the object will expire, based on the current values."""
+        if self.last_beat is None:
+            return None
         return self.last_beat + self.timeout
 
     @property
     def is_expired(self):
         """Tell whether the last beat expired."""
-        return self.expires_at < now()
+        return self.expires_at is not None and self.expires_at < now()
 
     @property
     def remaining_time(self):
@@ -88,15 +122,131 @@ class HeartbeatMonitor(models.Model):
         """Internal function to update a heartbeat.
         Use :func:`django_healthchecks.heartbeats.update_heartbeat` instead.
         """
-        extra_updates = {}
-        if timeout is not None:
-            extra_updates["timeout"] = timeout
-
-        rows = cls.objects.filter(name=name).update(last_beat=now(), **extra_updates)
-        if not rows:
-            return cls.objects.create(
-                name=name,
-                enabled=True,
-                timeout=timeout or default_timeout or _get_default_timeout(),
-                last_beat=now(),
+        cls._update_many({name: (now(), default_timeout, timeout)})
+
+    @classmethod
+    def _update_many(cls, beats):
+        """Internal function to update multiple heartbeats at once.
+        Use :func:`django_healthchecks.heartbeats.update_heartbeats` instead.
+
+        Existing heartbeats are updated with a single query. When the
+        database supports it, new heartbeats and forced timeouts are written
+        with an upsert query.
+
+        :param beats: A dict of ``name: (last_beat, default_timeout, timeout)``.
+        """
+        forced = {name: beat for name, beat in beats.items() if beat[2] is not None}
+        others = {name: beat for name, beat in beats.items() if beat[2] is None}
+
+        if cls._supports_upsert():
+            # The new expiry time is known, no need to read the timeout.
+            cls._upsert(forced, ["last_beat", "timeout", "expires_at"])
+        else:
+            cls._create_missing(forced, cls._update_existing(forced))
+
+        cls._create_missing(others, cls._update_existing(others))
+
+    @classmethod
+    def _update_existing(cls, beats):
+        """Update the existing heartbeats, and return the missing names.
+
+        Unless a timeout is forced, ``expires_at`` is calculated by the
+        database with the stored timeout.
+        """
+        if not beats:
+            return []
+
+        last_beats = {name: beat[0] for name, beat in beats.items()}
+        last_beat = _case_by_name(last_beats, EXPIRES_COLUMN_TYPE)
+        updates = {"last_beat": last_beat, "expires_at": last_beat + F("timeout")}
+
+        timeouts = {name: beat[2] for name, beat in beats.items()}
+        if all(timeout is not None for timeout in timeouts.values()):
+            updates["timeout"] = _case_by_name(timeouts, models.DurationField())
+            updates["expires_at"] = _case_by_name(
+                {name: last_beats[name] + timeouts[name] for name in beats},
+                EXPIRES_COLUMN_TYPE,
             )
+
+        rows = cls.objects.filter(name__in=beats).update(**updates)
+        if rows == len(beats):
+            return []
+        elif not rows:
+            return list(beats)
+
+        existing = set(
+            cls.objects.filter(name__in=beats).values_list("name", flat=True)
+        )
+        return [name for name in beats if name not in existing]
+
+    @classmethod
+    def _create_missing(cls, beats, names):
+        """Register the heartbeats that don't exist yet."""
+        if not names:
+            return
+
+        missing = {name: beats[name] for name in names}
+        if cls._supports_upsert():
+            # Another process may have registered the same name meanwhile.
+            cls._upsert(missing, ["last_beat", "expires_at"])
+            return
+
+        try:
+            with transaction.atomic(using=router.db_for_write(cls)):
+                cls.objects.bulk_create(
+                    [cls._new_monitor(name, *beat) for name, beat in missing.items()]
+                )
+        except IntegrityError:
+            # Another process registered the same name meanwhile.
+            cls.objects.bulk_create(
+                [cls._new_monitor(name, *beat) for name, beat in missing.items()],
+                ignore_conflicts=True,
+            )
+            cls._update_existing(missing)
+
+    @classmethod
+    def _upsert(cls, beats, update_fields):
+        """Insert or update the heartbeats with ``INSERT .. ON CONFLICT``."""
+        if not beats:
+            return
+
+        db = router.db_for_write(cls)
+        unique_fields = None
+        if connections[db].features.supports_update_conflicts_with_target:
+            unique_fields = ["name"]
+
+        cls.objects.using(db).bulk_create(
+            [cls._new_monitor(name, *beat) for name, beat in beats.items()],
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=update_fields,
+        )
+
+    @classmethod
+    def _supports_upsert(cls):
+        # bulk_create(update_conflicts=True) is available since Django 4.1
+        features = connections[router.db_for_write(cls)].features
+        return getattr(features, "supports_update_conflicts", False)
+
+    @classmethod
+    def _new_monitor(cls, name, last_beat, default_timeout=None, timeout=None):
+        monitor = cls(
+            name=name,
+            enabled=True,
+            timeout=timeout or default_timeout or _get_default_timeout(),
+            last_beat=last_beat,
+        )
+        monitor.expires_at = monitor.calculate_expires_at()
+        return monitor
+
+
+def _case_by_name(values, output_field):
+    """Give an expression that provides a different value for each name."""
+    if len(values) == 1:
+        value = next(iter(values.values()))
+        return Value(value, output_field=output_field)
+
+    return Case(
+        *[When(name=name, then=Value(value)) for name, value in values.items()],
+        output_field=output_field,
+    )
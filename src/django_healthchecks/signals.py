@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+#: Sent after every run of a check, e.g. to report the timings to an APM.
+#: The sender is the service name, the arguments are ``service``,
+#: ``duration`` (in seconds), ``result`` and ``exception`` (or ``None``).
+#: Results that are served from the cache are not runs, and are not sent.
+check_finished = Signal()
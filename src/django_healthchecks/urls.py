@@ -4,5 +4,8 @@ from django_healthchecks import views
 
 urlpatterns = [
     path(r"", views.HealthCheckView.as_view(), name="index"),
+    path(r"_heartbeats/", views.HeartbeatStatusView.as_view(), name="heartbeats"),
+    path(r"_metrics/", views.MetricsView.as_view(), name="metrics"),
+    path(r"_groups/<str:group>/", views.HealthCheckView.as_view(), name="group"),
     path(r"<str:service>/", views.HealthCheckServiceView.as_view(), name="service"),
 ]
@@ -1,14 +1,37 @@
+import asyncio
+import base64
+import functools
+import json
+import re
+from datetime import datetime, timezone
+
 import six
+from asgiref.sync import sync_to_async
+from django.apps import apps
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.http.response import Http404
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
 from django.views.decorators.cache import cache_control
 from django.views.generic import View
 
+from django_healthchecks import metrics
 from django_healthchecks.checker import (
     PermissionDenied,
+    acreate_report,
+    acreate_service_result,
+    check_permission,
     create_report,
     create_service_result,
+    get_registry,
+    is_stale,
+    result_cache,
 )
 
 
@@ -21,6 +44,29 @@ class NoCacheMixin(object):
         )
 
 
+class AsyncNoCacheMixin(object):
+    """Async-compatible version of the :class:`NoCacheMixin`.
+
+    This also marks the view as a coroutine function, so Django runs it
+    in the event loop on older Django versions too.
+    """
+
+    @classmethod
+    def as_view(cls, **kwargs):
+        view = super(AsyncNoCacheMixin, cls).as_view(**kwargs)
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+            patch_cache_control(
+                response, private=True, no_cache=True, no_store=True, max_age=0
+            )
+            return response
+
+        return functools.update_wrapper(async_view, view)
+
+
 class GetErrorStatusCodeMixin(object):
     def get_error_stats_code(self, request):
         """override status code based on header but only allow int and within
@@ -46,31 +92,97 @@ class GetErrorStatusCodeMixin(object):
         return getattr(settings, "HEALTH_CHECKS_ERROR_CODE", 200)
 
 
-class HealthCheckView(NoCacheMixin, GetErrorStatusCodeMixin, View):
-    def get(self, request, *args, **kwargs):
-        try:
-            report, is_healthy = create_report(request=request)
-        except PermissionDenied:
-            response = HttpResponse(status=401)
-            response["WWW-Authenticate"] = 'Basic realm="Healthchecks"'
-            return response
+class LastModifiedMixin(object):
+    def set_last_modified(self, response, services):
+        """Tell when the oldest of the (cached) results was checked, when each
+        result was checked, and which results were stale.
+        """
+        results = result_cache.get_many(services) if services else None
+        if results:
+            checked_at = min(result.checked_at for result in results.values())
+            response["Last-Modified"] = http_date(checked_at)
+            response["X-Healthcheck-Checked-At"] = ", ".join(
+                "%s=%s" % (service, _format_timestamp(result.checked_at))
+                for service, result in results.items()
+            )
+
+            stale = [
+                service
+                for service, result in results.items()
+                if is_stale(service, result)
+            ]
+            if stale:
+                response["X-Healthcheck-Stale"] = ", ".join(stale)
+        return response
+
+
+def _format_timestamp(timestamp):
+    """Give the timestamp in ISO 8601 format, in UTC."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+
+
+class ServerTimingMixin(object):
+    def get_timings(self, request):
+        """Give a dict to collect the duration of each check, when this is
+        requested with ``?timings=1``.
+        """
+        return {} if request.GET.get("timings") else None
+
+    def set_server_timing(self, response, timings):
+        """Report the duration of each check in the ``Server-Timing`` header."""
+        if timings:
+            response["Server-Timing"] = ", ".join(
+                "%s;dur=%.1f"
+                % (_SERVER_TIMING_INVALID.sub("_", service), duration * 1000)
+                for service, duration in timings.items()
+            )
+        return response
+
+
+# Characters that are not allowed in a Server-Timing metric name.
+_SERVER_TIMING_INVALID = re.compile(r"[^\w.!#$%&'*+^`|~-]")
+
+
+def _sync_to_async_if_shared(func):
+    """Offload the function to a thread when the results are stored in a
+    shared cache, as reading them is blocking I/O.
+    """
+    if result_cache.is_shared:
+        return sync_to_async(func)
+
+    async def call_directly(*args, **kwargs):
+        return func(*args, **kwargs)
+
+    return call_directly
+
+
+class BaseView(GetErrorStatusCodeMixin, LastModifiedMixin, ServerTimingMixin, View):
+    def create_unauthorized_response(self):
+        response = HttpResponse(status=401)
+        response["WWW-Authenticate"] = 'Basic realm="Healthchecks"'
+        return response
+
+
+class BaseHealthCheckView(BaseView):
+    def check_group(self, group):
+        """Raise a 404 when the requested group is not configured."""
+        if group is not None and group not in get_registry().groups:
+            raise Http404()
+
+    def create_report_response(self, request, report, is_healthy):
         status_code = 200 if is_healthy else self.get_error_stats_code(request)
-        return JsonResponse(report, status=status_code)
+        response = JsonResponse(report, status=status_code)
+        return self.set_last_modified(response, report.keys())
 
 
-class HealthCheckServiceView(NoCacheMixin, GetErrorStatusCodeMixin, View):
-    def get(self, request, service, *args, **kwargs):
+class BaseHealthCheckServiceView(BaseView):
+    def parse_service(self, service):
+        """Split the service name from the path to a nested result."""
         service_path = list(filter(lambda s: s, service.split("/")))
         service = service_path.pop(0)
-
-        try:
-            result = create_service_result(service=service, request=request)
-        except PermissionDenied:
-            response = HttpResponse(status=401)
-            response["WWW-Authenticate"] = 'Basic realm="Healthchecks"'
-            return response
-
-        return self.create_result_response(request, service, result, service_path)
+        return service, service_path
 
     def create_result_response(self, request, service, result, service_path):
         for nested in service_path:
@@ -83,9 +195,193 @@ class HealthCheckServiceView(NoCacheMixin, GetErrorStatusCodeMixin, View):
 
         if result in (True, False):
             status_code = 200 if result else self.get_error_stats_code(request)
-            return HttpResponse(str(result).lower(), status=status_code)
+            response = HttpResponse(str(result).lower(), status=status_code)
         elif isinstance(result, six.string_types) or isinstance(result, bytes):
-            return HttpResponse(result)
+            response = HttpResponse(result)
         else:
             # Django requires safe=False for non-dict values.
-            return JsonResponse(result, safe=False)
+            response = JsonResponse(result, safe=False)
+        return self.set_last_modified(response, [service])
+
+
+class HealthCheckView(NoCacheMixin, BaseHealthCheckView):
+    def get(self, request, group=None, *args, **kwargs):
+        self.check_group(group)
+        timings = self.get_timings(request)
+        try:
+            report, is_healthy = create_report(
+                request=request, timings=timings, group=group
+            )
+        except PermissionDenied:
+            return self.create_unauthorized_response()
+
+        response = self.create_report_response(request, report, is_healthy)
+        return self.set_server_timing(response, timings)
+
+
+class HealthCheckServiceView(NoCacheMixin, BaseHealthCheckServiceView):
+    def get(self, request, service, *args, **kwargs):
+        service, service_path = self.parse_service(service)
+        timings = self.get_timings(request)
+
+        try:
+            result = create_service_result(
+                service=service, request=request, timings=timings
+            )
+        except PermissionDenied:
+            return self.create_unauthorized_response()
+
+        response = self.create_result_response(request, service, result, service_path)
+        return self.set_server_timing(response, timings)
+
+
+class AsyncHealthCheckView(AsyncNoCacheMixin, BaseHealthCheckView):
+    """Variant of :class:`HealthCheckView` for ASGI deployments.
+
+    Async checks are awaited, other checks are executed in a thread.
+    """
+
+    async def get(self, request, group=None, *args, **kwargs):
+        self.check_group(group)
+        timings = self.get_timings(request)
+        try:
+            report, is_healthy = await acreate_report(
+                request=request, timings=timings, group=group
+            )
+        except PermissionDenied:
+            return self.create_unauthorized_response()
+
+        response = await _sync_to_async_if_shared(self.create_report_response)(
+            request, report, is_healthy
+        )
+        return self.set_server_timing(response, timings)
+
+
+class AsyncHealthCheckServiceView(AsyncNoCacheMixin, BaseHealthCheckServiceView):
+    """Variant of :class:`HealthCheckServiceView` for ASGI deployments."""
+
+    async def get(self, request, service, *args, **kwargs):
+        service, service_path = self.parse_service(service)
+        timings = self.get_timings(request)
+
+        try:
+            result = await acreate_service_result(
+                service=service, request=request, timings=timings
+            )
+        except PermissionDenied:
+            return self.create_unauthorized_response()
+
+        response = await _sync_to_async_if_shared(self.create_result_response)(
+            request, service, result, service_path
+        )
+        return self.set_server_timing(response, timings)
+
+
+class HeartbeatStatusView(NoCacheMixin, BaseView):
+    """Give the status of every heartbeat, without building the whole
+    report in memory.
+
+    By default the heartbeats are returned one page at a time. The response
+    contains a ``next`` cursor to request the following page. With
+    ``?stream=1``, all heartbeats are streamed in a single response.
+    The heartbeats can be filtered with ``?prefix=``.
+
+    Access is given with the credentials of the ``heartbeats`` service.
+    """
+
+    service = "heartbeats"
+
+    def get(self, request, *args, **kwargs):
+        # Heartbeats are optional, they need the app in the INSTALLED_APPS.
+        if not apps.is_installed("django_healthchecks"):
+            raise Http404()
+
+        from django_healthchecks.heartbeats import iter_heartbeat_statuses
+
+        try:
+            check_permission(self.service, request=request)
+        except PermissionDenied:
+            return self.create_unauthorized_response()
+
+        prefix = request.GET.get("prefix") or None
+        if request.GET.get("stream"):
+            statuses = iter_heartbeat_statuses(prefix=prefix)
+            return StreamingHttpResponse(
+                _stream_json_statuses(statuses), content_type="application/json"
+            )
+
+        try:
+            after = _decode_cursor(request.GET.get("cursor"))
+            limit = _get_page_limit(request.GET.get("limit"))
+        except ValueError:
+            return HttpResponseBadRequest()
+
+        # Fetch one more row to tell whether there is a next page.
+        statuses = list(
+            iter_heartbeat_statuses(prefix=prefix, after=after, limit=limit + 1)
+        )
+        cursor = None
+        if len(statuses) > limit:
+            statuses = statuses[:limit]
+            cursor = _encode_cursor(statuses[-1][0])
+
+        return JsonResponse({"results": dict(statuses), "next": cursor})
+
+
+class MetricsView(NoCacheMixin, BaseView):
+    """Expose the latest check results and heartbeats in the Prometheus
+    text format. The checks are not run for a scrape.
+
+    Access is given with the credentials of the ``metrics`` service.
+    """
+
+    service = "metrics"
+
+    def get(self, request, *args, **kwargs):
+        try:
+            check_permission(self.service, request=request)
+        except PermissionDenied:
+            return self.create_unauthorized_response()
+
+        return StreamingHttpResponse(
+            metrics.iter_metrics(), content_type=metrics.CONTENT_TYPE
+        )
+
+
+def _get_page_limit(value):
+    max_limit = getattr(settings, "HEALTHCHECKS_HEARTBEAT_PAGE_SIZE", 1000)
+    if not value:
+        return max_limit
+
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("Invalid limit")
+    return min(limit, max_limit)
+
+
+def _encode_cursor(name):
+    return base64.urlsafe_b64encode(name.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    name = base64.b64decode(cursor.encode("ascii"), altchars=b"-_", validate=True)
+    return name.decode("utf-8")
+
+
+def _stream_json_statuses(statuses, batch_size=1000):
+    """Write the statuses as JSON object, a batch of items at a time."""
+    yield '{"results": {'
+    separator = ""
+    batch = []
+    for name, status in statuses:
+        batch.append("%s: %s" % (json.dumps(name), json.dumps(status)))
+        if len(batch) == batch_size:
+            yield separator + ", ".join(batch)
+            separator = ", "
+            batch = []
+
+    if batch:
+        yield separator + ", ".join(batch)
+    yield "}}"
@@ -1,3 +1,4 @@
+import pytest
 from django.conf import settings
 
 
@@ -40,3 +41,34 @@ def pytest_configure():
         USE_TZ=True,
         ROOT_URLCONF="test_urls",
     )
+
+
+@pytest.fixture(autouse=True)
+def clear_checker_state():
+    from django_healthchecks.checker import (
+        check_metrics,
+        circuit_breaker,
+        result_cache,
+        single_flight,
+        stop_refresher,
+        timed_out_runs,
+    )
+
+    result_cache.clear()
+    check_metrics.clear()
+    circuit_breaker.clear()
+    single_flight.clear()
+    timed_out_runs.clear()
+    yield
+    stop_refresher()
+
+
+@pytest.fixture(autouse=True)
+def clear_heartbeat_state():
+    yield
+
+    from django_healthchecks.heartbeats import _backends, _buffer, _coalescer
+
+    _buffer.clear()
+    _coalescer.clear()
+    _backends.clear()
@@ -1,9 +1,92 @@
+import asyncio
 import base64
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
+import pytest
 import requests
 import requests_mock
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
 
 from django_healthchecks import checker
+from django_healthchecks.signals import check_finished
+
+
+def check_slow_true():
+    time.sleep(0.2)
+    return True
+
+
+def check_slow_false():
+    time.sleep(0.2)
+    return False
+
+
+def check_hanging():
+    time.sleep(2)
+    return True
+
+
+def check_raises():
+    raise ValueError("broken")
+
+
+flaky_results = []
+
+
+def check_flaky():
+    return flaky_results.pop(0)
+
+
+async def acheck_false():
+    return False
+
+
+async def acheck_slow_true():
+    await asyncio.sleep(0.2)
+    return True
+
+
+async def acheck_remote_addr(request):
+    return request.META["REMOTE_ADDR"]
+
+
+async def acheck_hanging():
+    await asyncio.sleep(2)
+    return True
+
+
+CALLS = []
+
+
+def check_counted():
+    CALLS.append(time.time())
+    return len(CALLS) % 2 == 1
+
+
+def check_slow_counted():
+    time.sleep(0.2)
+    return check_counted()
+
+
+ACALLS = []
+
+
+async def acheck_slow_counted():
+    ACALLS.append(1)
+    await asyncio.sleep(0.2)
+    return True
+
+
+@pytest.fixture
+def calls():
+    CALLS.clear()
+    return CALLS
 
 
 def test_create_report(settings):
@@ -25,6 +108,178 @@ def test_create_report(settings):
     assert is_healthy is True
 
 
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.cookies.append(self.headers.get("Cookie"))
+        body = b'{"cache_default": true}'
+        self.send_response(200)
+        self.send_header("Set-Cookie", "sessionid=secret; Path=/")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    server.connections = 0
+    server.cookies = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_connection_reuse(settings, http_server):
+    """Consecutive reports should reuse the pooled keep-alive connections."""
+    url = "http://127.0.0.1:%d/healthchecks/" % http_server.server_port
+    settings.HEALTH_CHECKS = {"remote1": url, "remote2": url}
+
+    for _ in range(10):
+        result, is_healthy = checker.create_report()
+        assert result == {
+            "remote1": {"cache_default": True},
+            "remote2": {"cache_default": True},
+        }
+
+    # One connection for each check that runs concurrently.
+    assert http_server.connections <= 2
+
+
+def test_http_session_cookies(settings, http_server):
+    """Cookies of one remote service should not be sent on later probes."""
+    url = "http://127.0.0.1:%d/healthchecks/" % http_server.server_port
+    settings.HEALTH_CHECKS = {"remote": url}
+
+    checker.create_report()
+    checker.create_report()
+    assert http_server.cookies == [None, None]
+    assert not checker.get_http_session().cookies
+
+
+def test_http_session_settings(settings):
+    settings.HEALTH_CHECKS_HTTP_POOL_SIZE = 2
+    settings.HEALTH_CHECKS_HTTP_RETRIES = 3
+    session = checker.get_http_session()
+    assert checker.get_http_session() is session
+
+    adapter = session.get_adapter("https://test.com/")
+    assert adapter._pool_maxsize == 2
+    assert adapter.max_retries.total == 3
+
+    settings.HEALTH_CHECKS_HTTP_RETRIES = 0
+    assert checker.get_http_session() is not session
+
+
+def slow_remote_response(delay):
+    def callback(request, context):
+        time.sleep(delay)
+        return {"cache_default": True}
+
+    return callback
+
+
+def test_remote_fan_out(settings):
+    settings.HEALTH_CHECKS_HTTP_TIMEOUT = 0.5
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+        "remote1": "https://remote1.com/api/healthchecks/",
+        "remote2": "https://remote2.com/api/healthchecks/",
+        "remote3": "https://remote3.com/api/healthchecks/",
+        "remote_slow": "https://slow.com/api/healthchecks/",
+    }
+
+    with requests_mock.Mocker() as mock:
+        for i in range(1, 4):
+            mock.get(
+                "https://remote%d.com/api/healthchecks/" % i,
+                json=slow_remote_response(0.2),
+            )
+        mock.get("https://slow.com/api/healthchecks/", json=slow_remote_response(2))
+
+        start = time.monotonic()
+        result, is_healthy = checker.create_report()
+        duration = time.monotonic() - start
+
+    assert result == {
+        "database": True,
+        "remote1": {"cache_default": True},
+        "remote2": {"cache_default": True},
+        "remote3": {"cache_default": True},
+        "remote_slow": False,
+    }
+    assert is_healthy is False
+    assert 0.5 <= duration < 0.8
+
+
+def test_remote_fan_out_concurrency(settings):
+    settings.HEALTH_CHECKS_HTTP_TIMEOUT = 0.3
+    settings.HEALTH_CHECKS_HTTP_CONCURRENCY = 1
+    settings.HEALTH_CHECKS = {
+        "remote1": "https://remote1.com/api/healthchecks/",
+        "remote2": "https://remote2.com/api/healthchecks/",
+    }
+
+    with requests_mock.Mocker() as mock:
+        mock.get(
+            "https://remote1.com/api/healthchecks/", json=slow_remote_response(0.2)
+        )
+        mock.get(
+            "https://remote2.com/api/healthchecks/", json=slow_remote_response(0.2)
+        )
+        result, is_healthy = checker.create_report()
+
+    # The second request doesn't fit in the budget
+    assert result == {"remote1": {"cache_default": True}, "remote2": False}
+
+
+def test_remote_fan_out_async(settings):
+    settings.HEALTH_CHECKS_HTTP_TIMEOUT = 0.5
+    settings.HEALTH_CHECKS = {
+        "remote1": "https://remote1.com/api/healthchecks/",
+        "remote2": "https://remote2.com/api/healthchecks/",
+        "remote_slow": "https://slow.com/api/healthchecks/",
+    }
+
+    async def timed_report():
+        start = time.monotonic()
+        result, is_healthy = await checker.acreate_report()
+        return result, time.monotonic() - start
+
+    with requests_mock.Mocker() as mock:
+        mock.get(
+            "https://remote1.com/api/healthchecks/", json=slow_remote_response(0.2)
+        )
+        mock.get(
+            "https://remote2.com/api/healthchecks/", json=slow_remote_response(0.2)
+        )
+        mock.get("https://slow.com/api/healthchecks/", json=slow_remote_response(1))
+
+        loop = asyncio.new_event_loop()
+        try:
+            result, duration = loop.run_until_complete(timed_report())
+        finally:
+            loop.close()
+
+    assert result == {
+        "remote1": {"cache_default": True},
+        "remote2": {"cache_default": True},
+        "remote_slow": False,
+    }
+    assert duration < 0.8
+
+
 def test_service_timeout(settings):
     settings.HEALTH_CHECKS = {
         "database": "django_healthchecks.contrib.check_dummy_true",
@@ -60,6 +315,432 @@ def test_create_report_err(settings):
     assert is_healthy is False
 
 
+def test_create_report_concurrent(settings):
+    settings.HEALTH_CHECKS_CONCURRENCY = 4
+    settings.HEALTH_CHECKS = {
+        "slow1": check_slow_true,
+        "slow2": check_slow_true,
+        "slow3": check_slow_false,
+        "fast": "django_healthchecks.contrib.check_dummy_true",
+    }
+
+    start = time.monotonic()
+    result, is_healthy = checker.create_report()
+    duration = time.monotonic() - start
+
+    assert result == {"slow1": True, "slow2": True, "slow3": False, "fast": True}
+    assert list(result) == ["slow1", "slow2", "slow3", "fast"]
+    assert is_healthy is False
+    assert duration < 0.4
+
+
+def test_create_report_check_timeout(settings):
+    settings.HEALTH_CHECKS_TIMEOUT = 0.1
+    settings.HEALTH_CHECKS = {
+        "hanging": check_hanging,
+        "database": "django_healthchecks.contrib.check_dummy_true",
+    }
+
+    start = time.monotonic()
+    result, is_healthy = checker.create_report()
+    duration = time.monotonic() - start
+
+    assert result == {"hanging": False, "database": True}
+    assert is_healthy is False
+    assert duration < 0.5
+
+
+def test_create_report_check_timeout_per_service(settings):
+    settings.HEALTH_CHECKS_TIMEOUT = {"slow": 1, "*": 0.1}
+    settings.HEALTH_CHECKS = {
+        "slow": check_slow_true,
+        "hanging": check_hanging,
+    }
+
+    result, is_healthy = checker.create_report()
+    assert result == {"slow": True, "hanging": False}
+
+
+def test_create_report_deadline(settings):
+    settings.HEALTH_CHECKS_REPORT_TIMEOUT = 0.3
+    settings.HEALTH_CHECKS = {
+        "slow1": check_slow_true,
+        "slow2": check_slow_true,
+        "slow3": check_slow_true,
+    }
+
+    start = time.monotonic()
+    result, is_healthy = checker.create_report()
+    duration = time.monotonic() - start
+
+    assert result == {"slow1": True, "slow2": False, "slow3": False}
+    assert is_healthy is False
+    assert duration < 0.5
+
+
+def test_create_report_deadline_raises(settings):
+    settings.HEALTH_CHECKS_REPORT_TIMEOUT = 1
+    settings.HEALTH_CHECKS = {"broken": check_raises}
+
+    with pytest.raises(ValueError):
+        checker.create_report()
+
+
+def test_create_service_result_timeout(settings):
+    settings.HEALTH_CHECKS_TIMEOUT = 0.1
+    settings.HEALTH_CHECKS = {"hanging": check_hanging}
+
+    start = time.monotonic()
+    assert checker.create_service_result("hanging") is False
+    assert time.monotonic() - start < 0.5
+
+
+def test_create_report_timed_out_run(settings):
+    release = threading.Event()
+    calls = []
+
+    def check_blocked():
+        calls.append(1)
+        release.wait(5)
+        return True
+
+    settings.HEALTH_CHECKS_TIMEOUT = 0.05
+    settings.HEALTH_CHECKS = {"blocked": check_blocked}
+
+    threads = threading.active_count()
+    for _ in range(20):
+        assert checker.create_report() == ({"blocked": False}, False)
+
+    # The run that timed out isn't started again while it's hanging.
+    assert len(calls) == 1
+    assert threading.active_count() <= threads + 1
+
+    release.set()
+    while checker.timed_out_runs.is_running("blocked"):
+        time.sleep(0.01)
+    assert checker.create_report() == ({"blocked": True}, True)
+    assert len(calls) == 2
+
+
+def test_check_pool_size(settings):
+    settings.HEALTH_CHECKS_CONCURRENCY = 4
+    settings.HEALTH_CHECKS_HTTP_CONCURRENCY = 2
+    assert checker.get_check_pool().size == 6
+
+    settings.HEALTH_CHECKS_THREAD_POOL_SIZE = 3
+    pool = checker.get_check_pool()
+    assert pool.size == 3
+    assert checker.get_check_pool() is pool
+
+
+@pytest.mark.django_db(transaction=True)
+def test_create_report_reuses_connections(settings, monkeypatch):
+    monkeypatch.setitem(connections.settings["default"], "CONN_MAX_AGE", None)
+    used = []
+
+    def check_connection():
+        connection = connections["default"]
+        connection.ensure_connection()
+        used.append(connection)
+        return True
+
+    pool = checker.CheckPool(1)
+    monkeypatch.setattr(checker, "_check_pool", pool)
+    settings.HEALTH_CHECKS_THREAD_POOL_SIZE = 1
+    settings.HEALTH_CHECKS_TIMEOUT = 1
+    settings.HEALTH_CHECKS = {"database": check_connection}
+
+    assert checker.create_report() == ({"database": True}, True)
+    assert checker.create_report() == ({"database": True}, True)
+    assert used[0] is used[1]
+    assert used[0].connection is not None
+
+    pool.submit(connections.close_all).result()
+    pool.shutdown()
+
+
+def test_create_report_cached(settings, calls):
+    settings.HEALTH_CHECKS_CACHE_TTL = {"counted": 60}
+    settings.HEALTH_CHECKS = {
+        "counted": check_counted,
+        "database": "django_healthchecks.contrib.check_dummy_true",
+    }
+
+    assert checker.create_report() == ({"counted": True, "database": True}, True)
+    assert checker.create_report() == ({"counted": True, "database": True}, True)
+    assert checker.create_service_result("counted") is True
+    assert len(calls) == 1
+
+    result = checker.result_cache.get("counted")
+    assert result.value is True
+    assert result.checked_at >= calls[0]
+    assert checker.result_cache.get("database") is None
+
+
+def test_create_report_cached_failure_ttl(settings, calls):
+    settings.HEALTH_CHECKS_CACHE_TTL = 60
+    settings.HEALTH_CHECKS_CACHE_FAILURE_TTL = 0
+    settings.HEALTH_CHECKS = {"counted": check_counted}
+
+    assert checker.create_service_result("counted") is True
+    checker.result_cache.clear()
+
+    # The failure is not cached, the success that follows is.
+    assert checker.create_service_result("counted") is False
+    assert checker.create_service_result("counted") is True
+    assert checker.create_service_result("counted") is True
+    assert len(calls) == 3
+
+
+def test_create_report_cached_alias(settings, calls):
+    settings.HEALTH_CHECKS_CACHE_TTL = 60
+    settings.HEALTH_CHECKS_CACHE_ALIAS = "default"
+    settings.HEALTH_CHECKS = {"counted": check_counted}
+
+    assert checker.create_service_result("counted") is True
+    checker.result_cache.clear()  # only clears process memory
+    assert checker.create_service_result("counted") is True
+    assert len(calls) == 1
+
+    cache.delete(checker.ResultCache.key_prefix + "counted")
+
+
+def test_create_report_stale_while_revalidate(settings, calls):
+    settings.HEALTH_CHECKS_CACHE_TTL = 0.1
+    settings.HEALTH_CHECKS_CACHE_MAX_STALE = 10
+    settings.HEALTH_CHECKS = {"counted": check_slow_counted}
+
+    assert checker.create_service_result("counted") is True
+    time.sleep(0.1)
+    assert checker.is_stale("counted", checker.result_cache.get("counted"))
+
+    # The stale result is returned right away, while it's refreshed once.
+    start = time.monotonic()
+    assert checker.create_service_result("counted") is True
+    assert checker.create_service_result("counted") is True
+    assert time.monotonic() - start < 0.1
+
+    time.sleep(0.3)
+    assert len(calls) == 2
+    assert checker.create_service_result("counted") is False
+
+
+def test_create_report_stale_limit(settings, calls):
+    settings.HEALTH_CHECKS_CACHE_TTL = 0.1
+    settings.HEALTH_CHECKS_CACHE_MAX_STALE = 0.1
+    settings.HEALTH_CHECKS = {"counted": check_counted}
+
+    assert checker.create_service_result("counted") is True
+    time.sleep(0.2)
+
+    # The result is too old to be served
+    assert checker.create_service_result("counted") is False
+    assert len(calls) == 2
+
+
+def test_create_report_cached_not_for_request(rf, settings):
+    settings.HEALTH_CHECKS_CACHE_TTL = 60
+    settings.HEALTH_CHECKS = {
+        "remote_addr": "django_healthchecks.contrib.check_remote_addr"
+    }
+    request = rf.get("/")
+    assert checker.create_service_result("remote_addr", request) == "127.0.0.1"
+    assert checker.result_cache.get("remote_addr") is None
+
+
+def test_refresher_refresh(settings, calls, monkeypatch):
+    monkeypatch.setattr(checker, "start_refresher", lambda: None)
+    settings.HEALTH_CHECKS_REFRESH_INTERVAL = {"counted": 60}
+    settings.HEALTH_CHECKS = {
+        "counted": check_counted,
+        "database": "django_healthchecks.contrib.check_dummy_true",
+    }
+
+    refresher = checker.Refresher()
+    assert 0 < refresher.refresh() <= 1
+    assert refresher.refresh() <= 1
+    assert len(calls) == 1
+    assert checker.result_cache.get("counted").value is True
+    assert checker.result_cache.get("database") is None
+
+    # The request uses the stored result
+    assert checker.create_report() == ({"counted": True, "database": True}, True)
+    assert len(calls) == 1
+
+
+def test_refresher_lease(settings, calls, monkeypatch):
+    """Only one of the processes refreshes a check with shared results."""
+    monkeypatch.setattr(checker, "start_refresher", lambda: None)
+    settings.HEALTH_CHECKS_CACHE_ALIAS = "default"
+    settings.HEALTH_CHECKS_REFRESH_INTERVAL = 60
+    settings.HEALTH_CHECKS = {"counted": check_counted}
+    worker1 = checker.Refresher()
+    worker2 = checker.Refresher()
+
+    worker1.refresh()
+    worker2.refresh()
+    assert len(calls) == 1
+    assert checker.create_service_result("counted") is True
+
+    # The lease is renewed by the owner
+    worker1._next_run = worker2._next_run = {}
+    worker2.refresh()
+    worker1.refresh()
+    assert len(calls) == 2
+
+    # Another process takes over when the lease is released
+    worker1.release_leases()
+    worker2._next_run = {}
+    worker2.refresh()
+    assert len(calls) == 3
+    assert worker2.acquire_lease("counted")
+    assert not worker1.acquire_lease("counted")
+
+    worker2.release_leases()
+    cache.clear()
+
+
+def test_refresher_runs_missing_result(settings, calls, monkeypatch):
+    monkeypatch.setattr(checker, "start_refresher", lambda: None)
+    settings.HEALTH_CHECKS_REFRESH_INTERVAL = 60
+    settings.HEALTH_CHECKS = {"counted": check_counted}
+
+    assert checker.create_service_result("counted") is True
+    assert checker.create_service_result("counted") is True
+    assert len(calls) == 1
+
+
+def test_refresher_thread(settings, calls):
+    settings.HEALTH_CHECKS_REFRESH_INTERVAL = 0.05
+    settings.HEALTH_CHECKS = {"counted": check_counted, "broken": check_raises}
+
+    refresher = checker.start_refresher()
+    assert refresher.is_alive()
+    assert checker.start_refresher() is refresher
+
+    time.sleep(0.3)
+    checker.stop_refresher()
+    refresher.join(1)
+
+    assert not refresher.is_alive()
+    assert len(calls) >= 3
+    assert checker.result_cache.get("broken").value is False
+
+
+def test_refresher_closes_old_connections(monkeypatch):
+    events = []
+    refresher = checker.Refresher()
+
+    def refresh():
+        events.append("refresh")
+        refresher.stop()
+        return 0
+
+    monkeypatch.setattr(
+        checker, "close_old_connections", lambda: events.append("close")
+    )
+    monkeypatch.setattr(refresher, "refresh", refresh)
+    refresher.run()
+    assert events == ["close", "refresh", "close"]
+
+
+def test_refresher_started_on_request(settings):
+    settings.HEALTH_CHECKS_REFRESH_INTERVAL = 10
+    settings.HEALTH_CHECKS = {}
+
+    apps.get_app_config("django_healthchecks").ready()
+    assert checker._refresher is None
+
+    checker.start_refresher_on_request(sender=None)
+    assert checker._refresher.is_alive()
+
+
+def test_refresher_not_configured():
+    assert checker.start_refresher() is None
+
+
+def test_acreate_report(settings):
+    settings.HEALTH_CHECKS = {
+        "async1": acheck_slow_true,
+        "async2": acheck_slow_true,
+        "sync": check_slow_true,
+        "database": "django_healthchecks.contrib.check_dummy_false",
+    }
+
+    start = time.monotonic()
+    result, is_healthy = asyncio.run(checker.acreate_report())
+    duration = time.monotonic() - start
+
+    assert result == {"async1": True, "async2": True, "sync": True, "database": False}
+    assert is_healthy is False
+    assert duration < 0.4
+
+
+def test_acreate_report_timeout(settings):
+    settings.HEALTH_CHECKS_TIMEOUT = {"async_hanging": 0.1}
+    settings.HEALTH_CHECKS_REPORT_TIMEOUT = 0.3
+    settings.HEALTH_CHECKS = {
+        "async_hanging": acheck_hanging,
+        "hanging": check_hanging,
+        "database": "django_healthchecks.contrib.check_dummy_true",
+    }
+
+    async def timed_report():
+        start = time.monotonic()
+        result, is_healthy = await checker.acreate_report()
+        return result, time.monotonic() - start
+
+    result, duration = asyncio.run(timed_report())
+    assert result == {"async_hanging": False, "hanging": False, "database": True}
+    assert duration < 0.5
+
+
+def test_acreate_report_timed_out_run(settings):
+    settings.HEALTH_CHECKS_SINGLE_FLIGHT = False
+    settings.HEALTH_CHECKS_TIMEOUT = 0.05
+    release = threading.Event()
+    calls = []
+
+    def check_blocked():
+        calls.append(1)
+        release.wait(5)
+        return True
+
+    settings.HEALTH_CHECKS = {"blocked": check_blocked}
+
+    async def run():
+        return [await checker.acreate_report() for _ in range(10)]
+
+    threads = threading.active_count()
+    assert asyncio.run(run()) == [({"blocked": False}, False)] * 10
+
+    # The run that timed out isn't started again while it's hanging.
+    assert len(calls) == 1
+    assert threading.active_count() <= threads + 1
+    release.set()
+
+
+def test_acreate_service_result(rf, settings):
+    settings.HEALTH_CHECKS = {"remote_addr": acheck_remote_addr}
+    request = rf.get("/")
+    result = asyncio.run(checker.acreate_service_result("remote_addr", request))
+    assert result == "127.0.0.1"
+    assert asyncio.run(checker.acreate_service_result("unknown", request)) is None
+
+
+def test_create_report_async_check(rf, settings, calls):
+    settings.HEALTH_CHECKS_CACHE_TTL = {"async": 60}
+    settings.HEALTH_CHECKS = {
+        "async": acheck_slow_true,
+        "remote_addr": acheck_remote_addr,
+    }
+
+    request = rf.get("/")
+    result, is_healthy = checker.create_report(request)
+    assert result == {"async": True, "remote_addr": "127.0.0.1"}
+    assert checker.result_cache.get("async").value is True
+
+
 def test_create_service_result(settings):
     settings.HEALTH_CHECKS = {
         "database": "django_healthchecks.contrib.check_dummy_true"
@@ -82,29 +763,494 @@ def test_create_with_request(rf, settings):
     assert result == "127.0.0.1"
 
 
-def test_filter_checks_on_permission(rf, settings):
-    checks = {
+def test_registry(settings, monkeypatch):
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+        "remote_addr": "django_healthchecks.contrib.check_remote_addr",
+        "remote_service": "https://test.com/api/healthchecks/",
+        "async": acheck_slow_true,
+    }
+    registry = checker.get_registry()
+    assert checker.get_registry() is registry
+    assert list(registry) == ["database", "remote_addr", "remote_service", "async"]
+
+    assert not registry["database"].uses_request
+    assert registry["remote_addr"].uses_request
+    assert registry["remote_service"].is_remote
+    assert registry["async"].is_async
+
+    # Nothing is resolved per request anymore
+    def fail(*args, **kwargs):
+        raise AssertionError("Should not be called")
+
+    monkeypatch.setattr(checker, "import_string", fail)
+    monkeypatch.setattr(checker.inspect, "getfullargspec", fail)
+    assert checker.create_service_result("database") is True
+
+
+def test_registry_reset(settings):
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+    }
+    registry = checker.get_registry()
+    assert list(registry) == ["database"]
+
+    settings.HEALTH_CHECKS = {
+        "i_fail": "django_healthchecks.contrib.check_dummy_false",
+    }
+    assert checker.get_registry() is not registry
+    assert list(checker.get_registry()) == ["i_fail"]
+    assert checker.create_report() == ({"i_fail": False}, False)
+
+
+def test_create_service_result_permissions(rf, settings, monkeypatch):
+    settings.HEALTH_CHECKS = {
         "public": "django_healthchecks.contrib.check_dummy_true",
         "private": "django_healthchecks.contrib.check_dummy_true",
     }
-
     settings.HEALTH_CHECKS_BASIC_AUTH = {
         "*": [("user", "password")],
         "public": [],
     }
 
-    request = rf.get("/")
-    result = checker._filter_checks_on_permission(request, checks)
-    assert result == {
+    with pytest.raises(checker.PermissionDenied):
+        checker.create_service_result("private", rf.get("/"))
+
+    request = rf.get(
+        "/", HTTP_AUTHORIZATION=b"Basic " + base64.b64encode(b"user:password")
+    )
+    assert checker.create_service_result("private", request) is True
+
+    # The public check doesn't need to decode the credentials.
+    def fail(*args, **kwargs):
+        raise AssertionError("Should not be called")
+
+    monkeypatch.setattr(checker, "_get_basic_auth", fail)
+    assert checker.create_service_result("public", request) is True
+
+
+def test_registry_credentials(rf, settings, monkeypatch):
+    settings.HEALTH_CHECKS = {
+        "check1": "django_healthchecks.contrib.check_dummy_true",
+        "check2": "django_healthchecks.contrib.check_dummy_true",
+        "check3": "django_healthchecks.contrib.check_dummy_true",
+    }
+    settings.HEALTH_CHECKS_BASIC_AUTH = {
+        "*": [("user", "password"), ("other", "pass:word")],
+        "check3": [("admin", "secret")],
+    }
+    registry = checker.get_registry()
+
+    # The credentials are compiled once for each setting
+    assert registry["check1"].required_credentials is (
+        registry["check2"].required_credentials
+    )
+    assert len(registry["check1"].required_credentials) == 2
+
+    decoded = []
+    get_basic_auth = checker._get_basic_auth
+
+    def counting_get_basic_auth(request):
+        decoded.append(request)
+        return get_basic_auth(request)
+
+    monkeypatch.setattr(checker, "_get_basic_auth", counting_get_basic_auth)
+
+    request = rf.get(
+        "/", HTTP_AUTHORIZATION=b"Basic " + base64.b64encode(b"other:pass:word")
+    )
+    assert list(registry.filter_on_permission(request)) == ["check1", "check2"]
+    assert checker.create_service_result("check1", request) is True
+    with pytest.raises(checker.PermissionDenied):
+        checker.create_service_result("check3", request)
+    assert len(decoded) == 1
+
+
+def test_registry_filter_on_permission(rf, settings):
+    settings.HEALTH_CHECKS = {
         "public": "django_healthchecks.contrib.check_dummy_true",
+        "private": "django_healthchecks.contrib.check_dummy_true",
     }
 
+    settings.HEALTH_CHECKS_BASIC_AUTH = {
+        "*": [("user", "password")],
+        "public": [],
+    }
+    registry = checker.get_registry()
+
+    request = rf.get("/")
+    result = registry.filter_on_permission(request)
+    assert result == {"public": registry["public"]}
+
     request = rf.get(
         "/", HTTP_AUTHORIZATION=b"Basic " + base64.b64encode(b"user:password")
     )
 
-    result = checker._filter_checks_on_permission(request, checks)
+    result = registry.filter_on_permission(request)
     assert result == {
-        "public": "django_healthchecks.contrib.check_dummy_true",
-        "private": "django_healthchecks.contrib.check_dummy_true",
+        "public": registry["public"],
+        "private": registry["private"],
+    }
+
+
+def test_create_report_timings(settings):
+    settings.HEALTH_CHECKS_TIMEOUT = {"hanging": 0.1, "*": None}
+    settings.HEALTH_CHECKS = {
+        "slow": check_slow_true,
+        "hanging": check_hanging,
+        "database": "django_healthchecks.contrib.check_dummy_true",
+    }
+
+    timings = {}
+    checker.create_report(timings=timings)
+
+    assert set(timings) == {"slow", "hanging", "database"}
+    assert 0.2 <= timings["slow"] < 0.5
+    assert 0.1 <= timings["hanging"] < 0.5
+    assert timings["database"] < 0.1
+
+
+def test_acreate_report_timings(settings):
+    settings.HEALTH_CHECKS = {
+        "async": acheck_slow_true,
+        "sync": check_slow_true,
+    }
+
+    timings = {}
+    async_to_sync(checker.acreate_report)(timings=timings)
+    assert 0.2 <= timings["async"] < 0.5
+    assert 0.2 <= timings["sync"] < 0.5
+
+
+def test_check_finished_signal(settings):
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+        "broken": check_raises,
+    }
+    received = []
+
+    def receiver(sender, **kwargs):
+        received.append((sender, kwargs))
+
+    check_finished.connect(receiver)
+    try:
+        checker.create_service_result("database")
+        with pytest.raises(ValueError):
+            checker.create_service_result("broken")
+    finally:
+        check_finished.disconnect(receiver)
+
+    assert [sender for sender, _ in received] == ["database", "broken"]
+
+    kwargs = received[0][1]
+    assert kwargs["service"] == "database"
+    assert kwargs["result"] is True
+    assert kwargs["exception"] is None
+    assert kwargs["duration"] >= 0
+
+    kwargs = received[1][1]
+    assert kwargs["result"] is None
+    assert isinstance(kwargs["exception"], ValueError)
+
+
+def test_check_finished_signal_cached(settings):
+    """Cached results are not a run of the check."""
+    settings.HEALTH_CHECKS_CACHE_TTL = 60
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true"
     }
+    received = []
+
+    def receiver(sender, **kwargs):
+        received.append(sender)
+
+    check_finished.connect(receiver)
+    try:
+        checker.create_report()
+        checker.create_report()
+    finally:
+        check_finished.disconnect(receiver)
+
+    assert received == ["database"]
+
+
+def test_circuit_breaker(settings):
+    settings.HEALTH_CHECKS_CIRCUIT_BREAKER_THRESHOLD = {"flaky": 2}
+    settings.HEALTH_CHECKS_CIRCUIT_BREAKER_COOLDOWN = 0.1
+    settings.HEALTH_CHECKS = {"flaky": check_flaky}
+    flaky_results[:] = [False, False, True, True]
+
+    assert checker.create_service_result("flaky") is False
+    assert not checker.circuit_breaker.is_open("flaky")
+    assert checker.create_service_result("flaky") is False
+    assert checker.circuit_breaker.is_open("flaky")
+
+    # The check isn't called while the circuit is open
+    assert checker.create_service_result("flaky") is False
+    assert flaky_results == [True, True]
+
+    # A trial run is allowed after the cool-down, which closes the circuit
+    time.sleep(0.1)
+    assert checker.create_service_result("flaky") is True
+    assert not checker.circuit_breaker.is_open("flaky")
+    assert flaky_results == [True]
+
+
+def test_circuit_breaker_failed_trial(settings):
+    settings.HEALTH_CHECKS_CIRCUIT_BREAKER_THRESHOLD = 1
+    settings.HEALTH_CHECKS_CIRCUIT_BREAKER_COOLDOWN = 0.2
+    settings.HEALTH_CHECKS = {"broken": check_raises}
+
+    with pytest.raises(ValueError):
+        checker.create_report()
+    assert checker.create_report() == ({"broken": False}, False)
+
+    time.sleep(0.2)
+    with pytest.raises(ValueError):
+        checker.create_report()
+
+    # The next trial waits for another cool-down
+    assert checker.create_report() == ({"broken": False}, False)
+
+
+def test_circuit_breaker_timeout(settings):
+    settings.HEALTH_CHECKS_CIRCUIT_BREAKER_THRESHOLD = 1
+    settings.HEALTH_CHECKS_TIMEOUT = 0.1
+    settings.HEALTH_CHECKS = {"hanging": check_hanging}
+
+    assert checker.create_report() == ({"hanging": False}, False)
+    assert checker.circuit_breaker.is_open("hanging")
+
+    start = time.monotonic()
+    assert checker.create_report() == ({"hanging": False}, False)
+    assert time.monotonic() - start < 0.1
+
+
+def test_circuit_breaker_late_run(settings):
+    """A run that missed its deadline doesn't close the circuit later on."""
+    settings.HEALTH_CHECKS_CIRCUIT_BREAKER_THRESHOLD = 2
+    settings.HEALTH_CHECKS_TIMEOUT = 0.05
+    release = threading.Event()
+
+    def check_slow():
+        release.wait(5)
+        return True
+
+    settings.HEALTH_CHECKS = {"slow": check_slow}
+
+    assert checker.create_report() == ({"slow": False}, False)
+    assert checker.create_report() == ({"slow": False}, False)
+    assert checker.circuit_breaker.is_open("slow")
+
+    release.set()
+    while checker.timed_out_runs.is_running("slow"):
+        time.sleep(0.01)
+    assert checker.circuit_breaker.is_open("slow")
+
+
+def test_circuit_breaker_async(settings):
+    settings.HEALTH_CHECKS_CIRCUIT_BREAKER_THRESHOLD = 1
+    settings.HEALTH_CHECKS = {"async": acheck_false}
+
+    assert async_to_sync(checker.acreate_report)() == ({"async": False}, False)
+    assert checker.circuit_breaker.is_open("async")
+
+
+def run_concurrently(func, count=10):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(func())) for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_single_flight(settings, calls):
+    settings.HEALTH_CHECKS = {"counted": check_slow_counted}
+
+    results = run_concurrently(lambda: checker.create_service_result("counted"))
+    assert results == [True] * 10
+    assert len(calls) == 1
+
+    # A new call runs the check again
+    assert checker.create_service_result("counted") is False
+    assert len(calls) == 2
+
+
+def test_single_flight_exception():
+    calls = []
+
+    def run():
+        try:
+            checker.single_flight.run("broken", check_slow_raises)
+        except ValueError as e:
+            return e
+
+    def check_slow_raises():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ValueError("broken")
+
+    results = run_concurrently(run, count=3)
+    assert len(calls) == 1
+    assert len({id(result) for result in results}) == 3
+    assert all(result.args == ("broken",) for result in results)
+
+    # The waiters raise a copy of the exception of the run.
+    [original] = [result for result in results if result.__cause__ is None]
+    assert all(result.__cause__ in (None, original) for result in results)
+
+
+def test_single_flight_wait_timeout(settings):
+    settings.HEALTH_CHECKS_TIMEOUT = 0.1
+    release = threading.Event()
+
+    def check_blocked():
+        release.wait(5)
+        return True
+
+    thread = threading.Thread(
+        target=checker.single_flight.run, args=("blocked", check_blocked)
+    )
+    thread.start()
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    assert checker.single_flight.run("blocked", check_blocked) is False
+    assert time.monotonic() - start < 0.5
+
+    release.set()
+    thread.join()
+
+
+def test_single_flight_clear(settings):
+    release = threading.Event()
+    thread = threading.Thread(
+        target=checker.single_flight.run, args=("a", lambda: release.wait(5))
+    )
+    thread.start()
+    time.sleep(0.05)
+
+    # New calls don't join the run that is still in flight.
+    checker.single_flight.clear()
+    assert checker.single_flight.run("a", lambda: "new") == "new"
+
+    release.set()
+    thread.join()
+    assert checker.single_flight.run("a", lambda: "next") == "next"
+
+
+def test_single_flight_disabled(settings, calls):
+    settings.HEALTH_CHECKS_SINGLE_FLIGHT = False
+    settings.HEALTH_CHECKS = {"counted": check_slow_counted}
+
+    run_concurrently(lambda: checker.create_service_result("counted"), count=3)
+    assert len(calls) == 3
+
+
+def test_single_flight_cache_lock(settings, calls):
+    """The cache lock lets other processes wait for the running check."""
+    settings.HEALTH_CHECKS_SINGLE_FLIGHT_CACHE_ALIAS = "default"
+    other_process = checker.SingleFlight()
+
+    thread = threading.Thread(
+        target=checker.single_flight.run, args=("counted", check_slow_counted)
+    )
+    thread.start()
+    time.sleep(0.05)
+
+    assert other_process.run("counted", check_slow_counted) is True
+    thread.join()
+    assert len(calls) == 1
+
+    # The lock is released, so the next run executes the check
+    assert other_process.run("counted", check_slow_counted) is False
+    assert len(calls) == 2
+    cache.clear()
+
+
+def test_single_flight_async(settings):
+    settings.HEALTH_CHECKS = {"async": acheck_slow_counted}
+    ACALLS.clear()
+
+    async def run():
+        report = await checker.acreate_service_result("async")
+        results = await asyncio.gather(
+            *[checker.acreate_service_result("async") for _ in range(5)]
+        )
+        return [report] + results
+
+    assert async_to_sync(run)() == [True] * 6
+    assert len(ACALLS) == 2
+
+
+def test_create_report_severity(settings):
+    settings.HEALTH_CHECKS_SEVERITY = {"redis": "warning"}
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+        "redis": "django_healthchecks.contrib.check_dummy_false",
+    }
+
+    # The failed warning is reported, but doesn't make the report unhealthy
+    report, is_healthy = checker.create_report()
+    assert report == {"database": True, "redis": False}
+    assert is_healthy is True
+
+    settings.HEALTH_CHECKS_SEVERITY = {"redis": "warning", "*": "warning"}
+    assert async_to_sync(checker.acreate_report)() == (report, True)
+
+
+def test_create_report_severity_invalid(settings):
+    settings.HEALTH_CHECKS_SEVERITY = {"redis": "optional"}
+    settings.HEALTH_CHECKS = {"redis": "django_healthchecks.contrib.check_dummy_false"}
+
+    with pytest.raises(ImproperlyConfigured):
+        checker.create_report()
+
+
+def test_create_report_fail_fast(settings, calls):
+    settings.HEALTH_CHECKS_FAIL_FAST = True
+    settings.HEALTH_CHECKS_SEVERITY = {"optional": "warning"}
+    settings.HEALTH_CHECKS = {
+        "optional": "django_healthchecks.contrib.check_dummy_false",
+        "redis": "django_healthchecks.contrib.check_dummy_false",
+        "counted": check_counted,
+    }
+
+    report, is_healthy = checker.create_report()
+    assert report == {"optional": False, "redis": False, "counted": None}
+    assert is_healthy is False
+    assert len(calls) == 0
+
+
+def test_create_report_fail_fast_concurrent(settings):
+    settings.HEALTH_CHECKS_FAIL_FAST = True
+    settings.HEALTH_CHECKS_CONCURRENCY = 2
+    settings.HEALTH_CHECKS = {
+        "hanging": check_hanging,
+        "redis": check_slow_false,
+        "database": "django_healthchecks.contrib.check_dummy_true",
+    }
+
+    start = time.monotonic()
+    report, is_healthy = checker.create_report()
+    assert time.monotonic() - start < 0.5
+    assert report == {"hanging": None, "redis": False, "database": None}
+    assert is_healthy is False
+
+
+def test_acreate_report_fail_fast(settings):
+    settings.HEALTH_CHECKS_FAIL_FAST = True
+    settings.HEALTH_CHECKS = {
+        "slow": acheck_slow_true,
+        "async": acheck_false,
+    }
+
+    start = time.monotonic()
+    report, is_healthy = async_to_sync(checker.acreate_report)()
+    assert time.monotonic() - start < 0.2
+    assert report == {"slow": None, "async": False}
+    assert is_healthy is False
@@ -1,13 +1,30 @@
+import base64
+import json
 from datetime import datetime, timedelta
+from importlib import import_module
+from types import SimpleNamespace
 
 import pytest
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404
 from django.urls import reverse
 from django.utils.timezone import utc
 from freezegun import freeze_time
 
+from django_healthchecks.backends import CacheBackend
 from django_healthchecks.contrib import check_expired_heartbeats, check_heartbeats
-from django_healthchecks.heartbeats import update_heartbeat, update_heartbeat_on_success
-from django_healthchecks.models import HeartbeatMonitor
+from django_healthchecks.heartbeats import (
+    _buffer,
+    flush_heartbeats,
+    get_backend,
+    update_heartbeat,
+    update_heartbeat_on_success,
+    update_heartbeats,
+)
+from django_healthchecks.models import HeartbeatMonitor, HeartbeatMonitorQuerySet
+from django_healthchecks.views import HeartbeatStatusView, _stream_json_statuses
 
 NOON = datetime(2018, 5, 3, 12, 0, 0, tzinfo=utc)
 ONE_HOUR_LATER = datetime(2018, 5, 3, 13, 1, 0, tzinfo=utc)
@@ -65,6 +82,26 @@ def test_check_expired(beat1, beat2, beat3):
     }
 
 
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_check_all_healthy(beat2, beat3, django_assert_num_queries):
+    """The disabled beat3 is expired, but shouldn't be reported."""
+    with django_assert_num_queries(1):
+        assert check_heartbeats() == {"__all__": True, "testing.beat2": False}
+
+
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_status_by_name(beat1, beat2, beat3):
+    assert HeartbeatMonitor.objects.status_by_name() == {
+        "testing.beat1": True,
+        "testing.beat2": False,
+        "testing.beat3": True,
+    }
+    assert not HeartbeatMonitor.objects.all_healthy()
+    assert HeartbeatMonitor.objects.filter(name="testing.beat2").all_healthy()
+
+
 @pytest.mark.django_db
 @freeze_time(ONE_HOUR_LATER)
 def test_expired_names(beat1, beat2, beat3):
@@ -119,6 +156,282 @@ def test_update_heartbeat_timeout(beat1):
     assert beat1.timeout == timedelta(days=3)
 
 
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_update_heartbeats(beat1, beat2, django_assert_num_queries):
+    # Update, select the missing names, and upsert or insert in a savepoint
+    expected_queries = 3 if HeartbeatMonitor._supports_upsert() else 5
+    with django_assert_num_queries(expected_queries):
+        update_heartbeats(
+            [beat1.name, beat2.name, "testing.new1", "testing.new2"],
+            default_timeout=timedelta(days=2),
+        )
+
+    assert HeartbeatMonitor.objects.count() == 4
+    beat1.refresh_from_db()
+    assert beat1.last_beat == ONE_HOUR_LATER
+    assert beat1.timeout == timedelta(hours=1)
+
+    new1 = HeartbeatMonitor.objects.get(name="testing.new1")
+    assert new1.last_beat == ONE_HOUR_LATER
+    assert new1.timeout == timedelta(days=2)
+
+
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_update_heartbeat_upsert(beat1, django_assert_num_queries):
+    """Every beat should be a single query, a new registration takes two."""
+    if not HeartbeatMonitor._supports_upsert():
+        pytest.skip("Database or Django version doesn't support upserts")
+
+    with django_assert_num_queries(1):
+        update_heartbeat(beat1.name)
+    with django_assert_num_queries(2):
+        update_heartbeat("testing.new", default_timeout=timedelta(days=2))
+    with django_assert_num_queries(1):
+        update_heartbeat("testing.new", default_timeout=timedelta(days=5))
+    with django_assert_num_queries(1):
+        update_heartbeat("testing.new", timeout=timedelta(days=3))
+
+    beat1.refresh_from_db()
+    assert beat1.last_beat == ONE_HOUR_LATER
+    assert beat1.timeout == timedelta(hours=1)
+    new = HeartbeatMonitor.objects.get(name="testing.new")
+    assert new.timeout == timedelta(days=3)
+    assert new.expires_at == ONE_HOUR_LATER + timedelta(days=3)
+
+
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_update_heartbeat_fallback(beat1, monkeypatch, django_assert_num_queries):
+    monkeypatch.setattr(
+        HeartbeatMonitor, "_supports_upsert", classmethod(lambda c: False)
+    )
+
+    with django_assert_num_queries(1):
+        update_heartbeat(beat1.name)
+    with django_assert_num_queries(4):
+        # Update, and the insert in a savepoint
+        update_heartbeat("testing.new", default_timeout=timedelta(days=2))
+
+    assert HeartbeatMonitor.objects.get(name="testing.new").timeout == timedelta(days=2)
+
+
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_update_heartbeat_fallback_race(beat1, monkeypatch):
+    """See that a concurrent registration doesn't raise an IntegrityError."""
+    monkeypatch.setattr(
+        HeartbeatMonitor, "_supports_upsert", classmethod(lambda c: False)
+    )
+    update = HeartbeatMonitorQuerySet.update
+    calls = []
+
+    def racing_update(self, **kwargs):
+        # The first update happens before the other process inserted the row.
+        calls.append(kwargs)
+        return 0 if len(calls) == 1 else update(self, **kwargs)
+
+    monkeypatch.setattr(HeartbeatMonitorQuerySet, "update", racing_update)
+    update_heartbeat(beat1.name, timeout=timedelta(days=3))
+
+    assert len(calls) == 2
+    assert HeartbeatMonitor.objects.count() == 1
+    beat1.refresh_from_db()
+    assert beat1.last_beat == ONE_HOUR_LATER
+    assert beat1.timeout == timedelta(days=3)
+
+
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_update_heartbeats_timeout(beat1, beat2):
+    update_heartbeats([beat1.name], timeout=timedelta(days=3))
+    beat1.refresh_from_db()
+    beat2.refresh_from_db()
+    assert beat1.timeout == timedelta(days=3)
+    assert beat2.timeout == timedelta(hours=1, minutes=8)
+
+
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_update_heartbeats_expires_at(beat1, beat2, beat3):
+    """The stored expiry time should follow the timeout of every heartbeat."""
+    assert beat1.expires_at == NOON + timedelta(hours=1)
+
+    update_heartbeats([beat1.name, beat2.name])
+    update_heartbeats([beat3.name, "testing.new"], timeout=timedelta(days=3))
+
+    expires_at = dict(HeartbeatMonitor.objects.values_list("name", "expires_at"))
+    assert expires_at == {
+        "testing.beat1": ONE_HOUR_LATER + timedelta(hours=1),
+        "testing.beat2": ONE_HOUR_LATER + timedelta(hours=1, minutes=8),
+        "testing.beat3": ONE_HOUR_LATER + timedelta(days=3),
+        "testing.new": ONE_HOUR_LATER + timedelta(days=3),
+    }
+
+
+@pytest.mark.django_db
+def test_expires_at_migration(beat1, beat2):
+    """See that the migration fills the expiry time of existing heartbeats."""
+    migration = import_module(
+        "django_healthchecks.migrations.0002_heartbeatmonitor_expires_at"
+    )
+    HeartbeatMonitor.objects.update(expires_at=None)
+
+    migration.fill_expires_at(apps, SimpleNamespace(connection=connection))
+
+    beat1.refresh_from_db()
+    beat2.refresh_from_db()
+    assert beat1.expires_at == NOON + timedelta(hours=1)
+    assert beat2.expires_at == NOON + timedelta(hours=1, minutes=8)
+
+
+@pytest.mark.django_db
+def test_update_heartbeat_buffered(settings, beat1, django_assert_num_queries):
+    settings.HEALTHCHECKS_HEARTBEAT_BUFFER_INTERVAL = 60
+
+    with freeze_time(ONE_HOUR_LATER), django_assert_num_queries(0):
+        update_heartbeat(beat1.name)
+        update_heartbeat("testing.new", default_timeout=timedelta(days=2))
+
+    with freeze_time(ONE_HOUR_LATER + timedelta(minutes=1)):
+        update_heartbeat(beat1.name, timeout=timedelta(days=3))
+        update_heartbeats(["testing.new"], default_timeout=timedelta(days=5))
+
+    assert HeartbeatMonitor.objects.count() == 1
+    beat1.refresh_from_db()
+    assert beat1.last_beat == NOON
+
+    flush_heartbeats()
+
+    beat1.refresh_from_db()
+    assert beat1.last_beat == ONE_HOUR_LATER + timedelta(minutes=1)
+    assert beat1.timeout == timedelta(days=3)
+
+    new = HeartbeatMonitor.objects.get(name="testing.new")
+    assert new.last_beat == ONE_HOUR_LATER + timedelta(minutes=1)
+    assert new.timeout == timedelta(days=2)
+
+    # Nothing left to write
+    with django_assert_num_queries(0):
+        flush_heartbeats()
+
+
+@pytest.mark.django_db
+def test_update_heartbeat_min_interval(
+    settings, monkeypatch, django_assert_num_queries
+):
+    settings.HEALTHCHECKS_HEARTBEAT_MIN_INTERVAL = 0.1  # of the timeout
+    clock = [1000.0]
+    monkeypatch.setattr(
+        "django_healthchecks.heartbeats.time.monotonic", lambda: clock[0]
+    )
+    monkeypatch.setattr(_buffer, "start", lambda: None)
+
+    with freeze_time(NOON):
+        update_heartbeat("testing.hot", timeout=timedelta(hours=1))
+
+    # Writes within 6 minutes are skipped
+    with django_assert_num_queries(0):
+        for i in range(100):
+            clock[0] += 3
+            update_heartbeat("testing.hot")
+
+    beat = HeartbeatMonitor.objects.get(name="testing.hot")
+    assert beat.last_beat == NOON
+
+    clock[0] += 60
+    with freeze_time(ONE_HOUR_LATER):
+        update_heartbeats(
+            ["testing.hot", "testing.other"], default_timeout=timedelta(hours=1)
+        )
+
+    beat.refresh_from_db()
+    assert beat.last_beat == ONE_HOUR_LATER
+    assert HeartbeatMonitor.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_update_heartbeat_min_interval_held(settings, monkeypatch):
+    settings.HEALTHCHECKS_HEARTBEAT_MIN_INTERVAL = timedelta(minutes=1)
+    clock = [1000.0]
+    monkeypatch.setattr(
+        "django_healthchecks.heartbeats.time.monotonic", lambda: clock[0]
+    )
+    monkeypatch.setattr(_buffer, "start", lambda: None)
+
+    with freeze_time(NOON):
+        update_heartbeat("testing.hot", default_timeout=timedelta(hours=1))
+    with freeze_time(NOON + timedelta(seconds=10)):
+        update_heartbeat("testing.hot")
+    with freeze_time(NOON + timedelta(seconds=30)):
+        update_heartbeat("testing.hot")
+
+    # The latest beat is held back until the interval has passed.
+    clock[0] += 30
+    _buffer.flush(include_held=False)
+    beat = HeartbeatMonitor.objects.get(name="testing.hot")
+    assert beat.last_beat == NOON
+
+    clock[0] += 30
+    _buffer.flush(include_held=False)
+    beat.refresh_from_db()
+    assert beat.last_beat == NOON + timedelta(seconds=30)
+
+    # Nothing is held back anymore, the next beat starts a new interval.
+    with freeze_time(NOON + timedelta(seconds=70)):
+        update_heartbeat("testing.hot")
+    flush_heartbeats()
+    beat.refresh_from_db()
+    assert beat.last_beat == NOON + timedelta(seconds=70)
+
+
+@pytest.mark.django_db
+def test_update_heartbeat_min_interval_forced_timeout(settings):
+    settings.HEALTHCHECKS_HEARTBEAT_MIN_INTERVAL = 0.5
+
+    update_heartbeat("testing.hot", default_timeout=timedelta(hours=1))
+    update_heartbeat("testing.hot", timeout=timedelta(days=3))
+
+    beat = HeartbeatMonitor.objects.get(name="testing.hot")
+    assert beat.timeout == timedelta(days=3)
+
+
+@pytest.mark.django_db
+def test_update_heartbeat_min_interval_unknown_timeout(settings):
+    settings.HEALTHCHECKS_HEARTBEAT_MIN_INTERVAL = 0.5
+    HeartbeatMonitor.objects.create(
+        name="testing.admin", timeout=timedelta(minutes=10), last_beat=NOON
+    )
+
+    @update_heartbeat_on_success("testing.admin")
+    def foo():
+        pass
+
+    # The timeout that is stored in the database isn't known, so every
+    # beat is written.
+    with freeze_time(NOON + timedelta(minutes=5)):
+        foo()
+    with freeze_time(NOON + timedelta(minutes=10)):
+        foo()
+
+    beat = HeartbeatMonitor.objects.get(name="testing.admin")
+    assert beat.last_beat == NOON + timedelta(minutes=10)
+    assert beat.timeout == timedelta(minutes=10)
+
+
+@pytest.mark.django_db
+def test_update_heartbeat_min_interval_timedelta(settings, django_assert_num_queries):
+    settings.HEALTHCHECKS_HEARTBEAT_MIN_INTERVAL = timedelta(minutes=1)
+
+    update_heartbeat("testing.hot")
+    with django_assert_num_queries(0):
+        update_heartbeat("testing.hot")
+
+    with django_assert_num_queries(2 if HeartbeatMonitor._supports_upsert() else 4):
+        update_heartbeat("testing.other")
+
+
 @pytest.mark.django_db
 @freeze_time(ONE_HOUR_LATER)
 def test_update_heartbeat_on_success(beat1):
@@ -165,6 +478,92 @@ def test_remaining_time(beat1, beat2):
     assert beat2.remaining_time == timedelta(minutes=7)
 
 
+def test_heartbeat_status_view_not_installed(rf, monkeypatch):
+    monkeypatch.setattr(apps, "is_installed", lambda app_name: False)
+
+    with pytest.raises(Http404):
+        HeartbeatStatusView.as_view()(rf.get("/"))
+
+
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_heartbeat_status_view(rf, beat1, beat2, beat3):
+    view = HeartbeatStatusView.as_view()
+
+    response = view(rf.get("/", {"limit": 1}))
+    data = json.loads(response.content.decode())
+    assert data["results"] == {"testing.beat1": True}
+    assert data["next"]
+
+    response = view(rf.get("/", {"limit": 1, "cursor": data["next"]}))
+    data = json.loads(response.content.decode())
+    # The disabled beat3 is not included
+    assert data == {"results": {"testing.beat2": False}, "next": None}
+
+
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_heartbeat_status_view_prefix(rf, settings, beat1, beat2):
+    settings.HEALTHCHECKS_HEARTBEAT_PAGE_SIZE = 5
+    HeartbeatMonitor.objects.bulk_create(
+        HeartbeatMonitor(name="other.%d" % i, timeout=timedelta(hours=1))
+        for i in range(10)
+    )
+
+    response = HeartbeatStatusView.as_view()(rf.get("/", {"prefix": "testing."}))
+    data = json.loads(response.content.decode())
+    assert data == {
+        "results": {"testing.beat1": True, "testing.beat2": False},
+        "next": None,
+    }
+
+    # The page size limits the requested number of heartbeats
+    response = HeartbeatStatusView.as_view()(rf.get("/", {"limit": 100}))
+    data = json.loads(response.content.decode())
+    assert len(data["results"]) == 5
+    assert data["next"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("backend", [None, "cache"])
+@freeze_time(ONE_HOUR_LATER)
+def test_heartbeat_status_view_stream(rf, request, backend, beat1, beat2, beat3):
+    if backend:
+        request.getfixturevalue("cache_backend")
+
+    response = HeartbeatStatusView.as_view()(rf.get("/", {"stream": "1"}))
+    assert response.streaming
+
+    data = json.loads(b"".join(response.streaming_content).decode())
+    assert data == {"results": {"testing.beat1": True, "testing.beat2": False}}
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 3])
+def test_stream_json_statuses(count):
+    statuses = [("beat%d" % i, bool(i % 2)) for i in range(count)]
+    content = "".join(_stream_json_statuses(iter(statuses), batch_size=2))
+    assert json.loads(content) == {"results": dict(statuses)}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("params", [{"cursor": "%%"}, {"limit": "0"}])
+def test_heartbeat_status_view_bad_request(rf, params):
+    response = HeartbeatStatusView.as_view()(rf.get("/", params))
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_heartbeat_status_view_permission(rf, settings):
+    settings.HEALTH_CHECKS_BASIC_AUTH = {"heartbeats": [("user", "password")]}
+
+    response = HeartbeatStatusView.as_view()(rf.get("/"))
+    assert response.status_code == 401
+
+    auth = "Basic %s" % base64.b64encode(b"user:password").decode()
+    response = HeartbeatStatusView.as_view()(rf.get("/", HTTP_AUTHORIZATION=auth))
+    assert response.status_code == 200
+
+
 @pytest.mark.django_db
 @freeze_time(ONE_HOUR_LATER)
 def test_admin_list_view(admin_client, beat1, beat2, beat3):
@@ -191,3 +590,84 @@ def test_admin_change_view(admin_client, beat1):
     assert response.status_code == 200
     content = response.render().content  # make sure template rendering works
     assert b"icon-alert.svg" in content
+
+
+@pytest.fixture
+def cache_backend(settings):
+    settings.HEALTHCHECKS_HEARTBEAT_BACKEND = (
+        "django_healthchecks.backends.CacheBackend"
+    )
+    backend = get_backend()
+    yield backend
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_cache_backend(cache_backend, django_assert_num_queries):
+    assert isinstance(cache_backend, CacheBackend)
+    assert get_backend() is cache_backend
+
+    with freeze_time(NOON):
+        update_heartbeat("testing.beat1", default_timeout=timedelta(hours=1))
+        update_heartbeats(["testing.beat2"], default_timeout=timedelta(hours=2))
+
+    # Registered in the database, so the admin can manage the timeouts.
+    beat1 = HeartbeatMonitor.objects.get(name="testing.beat1")
+    assert beat1.timeout == timedelta(hours=1)
+
+    # Consecutive beats only write to the cache
+    with freeze_time(NOON + timedelta(minutes=30)), django_assert_num_queries(0):
+        update_heartbeat("testing.beat1", default_timeout=timedelta(hours=1))
+
+    beat1.refresh_from_db()
+    assert beat1.last_beat == NOON
+    assert cache_backend.get_last_beat(beat1) == NOON + timedelta(minutes=30)
+
+    with freeze_time(ONE_HOUR_LATER + timedelta(minutes=30)):
+        assert check_expired_heartbeats() == ["testing.beat1"]
+        assert check_heartbeats() == {
+            "__all__": False,
+            "testing.beat1": True,
+            "testing.beat2": False,
+        }
+
+
+@pytest.mark.django_db
+def test_cache_backend_timeout(cache_backend, django_assert_num_queries):
+    with freeze_time(NOON):
+        update_heartbeat("testing.beat1", timeout=timedelta(hours=1))
+        with django_assert_num_queries(0):
+            update_heartbeat("testing.beat1", timeout=timedelta(hours=1))
+        update_heartbeat("testing.beat1", timeout=timedelta(hours=3))
+
+    beat1 = HeartbeatMonitor.objects.get(name="testing.beat1")
+    assert beat1.timeout == timedelta(hours=3)
+
+    with freeze_time(ONE_HOUR_LATER):
+        assert check_expired_heartbeats() is None
+
+
+@pytest.mark.django_db
+@freeze_time(ONE_HOUR_LATER)
+def test_cache_backend_fallback(cache_backend, beat1, beat2):
+    """Heartbeats that are not in the cache use the database value."""
+    assert check_expired_heartbeats() == ["testing.beat1"]
+
+
+@pytest.mark.django_db
+def test_cache_backend_admin(cache_backend, admin_client, beat1):
+    with freeze_time(ONE_HOUR_LATER):
+        update_heartbeat(beat1.name)
+
+    with freeze_time(ONE_HOUR_LATER + timedelta(minutes=5)):
+        url = reverse("admin:django_healthchecks_heartbeatmonitor_changelist")
+        response = admin_client.get(url)
+        assert response.status_code == 200
+        assert b"icon-alert.svg" not in response.render().content
+
+        url = reverse(
+            "admin:django_healthchecks_heartbeatmonitor_change", args=(beat1.pk,)
+        )
+        response = admin_client.get(url)
+        assert response.status_code == 200
+        assert b"icon-alert.svg" not in response.render().content
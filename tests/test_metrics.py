@@ -0,0 +1,201 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from freezegun import freeze_time
+
+from django_healthchecks import checker
+from django_healthchecks.metrics import CONTENT_TYPE, iter_metrics
+from django_healthchecks.models import HeartbeatMonitor
+from django_healthchecks.views import MetricsView
+
+calls = []
+release = threading.Event()
+
+
+def check_counted():
+    calls.append(1)
+    return True
+
+
+def check_raises():
+    raise ValueError("Broken")
+
+
+def check_blocking():
+    release.wait(2)
+    return True
+
+
+async def acheck_false():
+    return False
+
+
+def get_metrics(rf):
+    response = MetricsView.as_view()(rf.get("/"))
+    assert response["Content-Type"] == CONTENT_TYPE
+    return b"".join(response.streaming_content).decode()
+
+
+@pytest.mark.django_db
+def test_metrics_view(rf, settings):
+    settings.HEALTH_CHECKS = {
+        "counted": check_counted,
+        "database": "django_healthchecks.contrib.check_dummy_false",
+    }
+    del calls[:]
+    checker.create_report()
+    checker.create_report()
+
+    content = get_metrics(rf)
+    assert len(calls) == 2  # The scrape doesn't run the checks.
+
+    assert "# TYPE healthchecks_check_status gauge\n" in content
+    assert 'healthchecks_check_status{service="counted"} 1\n' in content
+    assert 'healthchecks_check_status{service="database"} 0\n' in content
+    assert 'healthchecks_check_runs_total{service="counted"} 2\n' in content
+    assert 'healthchecks_check_failures_total{service="counted"} 0\n' in content
+    assert 'healthchecks_check_failures_total{service="database"} 2\n' in content
+    assert 'healthchecks_check_duration_seconds{service="counted"} ' in content
+
+
+@pytest.mark.django_db
+def test_metrics_not_run(rf, settings):
+    settings.HEALTH_CHECKS = {"counted": check_counted}
+
+    content = get_metrics(rf)
+    assert "# TYPE healthchecks_check_status gauge\n" in content
+    assert 'service="counted"' not in content
+
+
+def test_metrics_exception(settings):
+    settings.HEALTH_CHECKS = {"broken": check_raises}
+
+    with pytest.raises(ValueError):
+        checker.create_report()
+
+    metric = checker.check_metrics.get_many(["broken"])["broken"]
+    assert metric.healthy is False
+    assert (metric.runs, metric.failures) == (1, 1)
+
+
+@pytest.mark.django_db
+def test_metrics_timeout(settings):
+    settings.HEALTH_CHECKS_TIMEOUT = 0.05
+    settings.HEALTH_CHECKS = {"blocking": check_blocking}
+    release.clear()
+
+    assert checker.create_report() == ({"blocking": False}, False)
+    metrics = checker.check_metrics.get_many(["blocking"])
+    assert metrics["blocking"].timeouts == 1
+    assert metrics["blocking"].runs == 0
+    assert metrics["blocking"].healthy is False
+    assert metrics["blocking"].checked_at is not None
+    assert metrics["blocking"].duration is None
+
+    content = "".join(iter_metrics())
+    assert 'healthchecks_check_status{service="blocking"} 0\n' in content
+    assert 'healthchecks_check_duration_seconds{service="blocking"}' not in content
+
+    # The late result of the run doesn't overwrite the timeout.
+    release.set()
+    while checker.timed_out_runs.is_running("blocking"):
+        time.sleep(0.01)
+    metrics = checker.check_metrics.get_many(["blocking"])
+    assert metrics["blocking"].healthy is False
+    assert metrics["blocking"].runs == 0
+
+
+def test_metrics_async(settings):
+    settings.HEALTH_CHECKS = {"async": acheck_false}
+
+    async_to_sync(checker.acreate_report)()
+
+    metric = checker.check_metrics.get_many(["async"])["async"]
+    assert metric.healthy is False
+    assert (metric.runs, metric.failures) == (1, 1)
+
+
+def test_metrics_cached(settings):
+    settings.HEALTH_CHECKS_CACHE_TTL = 60
+    settings.HEALTH_CHECKS = {"counted": check_counted}
+
+    checker.create_report()
+    checker.create_report()
+
+    # The cached result is not measured as a run.
+    assert checker.check_metrics.get_many(["counted"])["counted"].runs == 1
+
+
+def test_metrics_shared_cache(settings):
+    settings.HEALTH_CHECKS_CACHE_ALIAS = "default"
+    settings.HEALTH_CHECKS = {
+        "counted": check_counted,
+        "database": "django_healthchecks.contrib.check_dummy_false",
+    }
+    cache.clear()
+
+    checker.create_report()
+    checker.create_report()
+    checker.check_metrics.record_timeout("database")
+    checker.check_metrics.clear()  # Only clears the process memory
+
+    metrics = checker.check_metrics.get_many(["counted", "database", "unknown"])
+    assert set(metrics) == {"counted", "database"}
+    assert metrics["counted"].healthy is True
+    assert (metrics["counted"].runs, metrics["counted"].failures) == (2, 0)
+    assert metrics["database"].healthy is False
+    assert metrics["database"].failures == 2
+    assert metrics["database"].timeouts == 1
+    cache.clear()
+
+
+def test_metrics_shared_cache_calls(settings, monkeypatch):
+    settings.HEALTH_CHECKS_CACHE_ALIAS = "default"
+    cache.clear()
+    checker.check_metrics.record("database", False, 0.1)
+
+    cache_calls = []
+    for name in ("add", "get", "incr", "set"):
+        method = getattr(cache, name)
+
+        def counted(*args, name=name, method=method, **kwargs):
+            cache_calls.append(name)
+            return method(*args, **kwargs)
+
+        monkeypatch.setattr(cache, name, counted)
+
+    checker.check_metrics.record("database", False, 0.1)
+    assert cache_calls == ["set", "incr", "incr"]
+    metrics = checker.check_metrics.get_many(["database"])
+    assert (metrics["database"].runs, metrics["database"].failures) == (2, 2)
+    cache.clear()
+
+
+@pytest.mark.django_db
+@freeze_time(datetime(2018, 5, 3, 12, 30, 0, tzinfo=timezone.utc))
+def test_metrics_heartbeats(rf):
+    HeartbeatMonitor.objects.create(
+        name='testing."beat"',
+        timeout=timedelta(hours=1),
+        last_beat=datetime(2018, 5, 3, 12, 0, 0, tzinfo=timezone.utc),
+    )
+    HeartbeatMonitor.objects.create(name="testing.new", timeout=timedelta(hours=1))
+
+    content = "".join(iter_metrics())
+    assert "# TYPE healthchecks_heartbeat_remaining_seconds gauge\n" in content
+    assert (
+        'healthchecks_heartbeat_remaining_seconds{name="testing.\\"beat\\""} 1800.0\n'
+        in content
+    )
+    assert "testing.new" not in content
+
+
+def test_metrics_permission(rf, settings):
+    settings.HEALTH_CHECKS_BASIC_AUTH = {"*": [("user", "password")]}
+
+    response = MetricsView.as_view()(rf.get("/"))
+    assert response.status_code == 401
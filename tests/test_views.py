@@ -1,11 +1,16 @@
+import asyncio
 import json
+import time
 from collections import OrderedDict
 
 import pytest
 import requests_mock
+from asgiref.sync import async_to_sync
+from django.core.exceptions import ImproperlyConfigured
 from django.http import Http404
+from freezegun import freeze_time
 
-from django_healthchecks import views
+from django_healthchecks import checker, views
 
 
 def check_int():
@@ -16,6 +21,19 @@ def check_float():
     return 1.5
 
 
+def check_raises():
+    raise ValueError("broken")
+
+
+def check_slow_true():
+    time.sleep(0.2)
+    return True
+
+
+async def acheck_true():
+    return True
+
+
 def test_index_view(rf, settings):
     settings.HEALTH_CHECKS = {
         "database": "django_healthchecks.contrib.check_dummy_true",
@@ -196,3 +214,193 @@ def test_service_require_auth(rf, settings):
 
     result = view.dispatch(request, service="database")
     assert result.status_code == 401
+
+
+def test_service_view_last_modified(rf, settings):
+    settings.HEALTH_CHECKS_CACHE_TTL = 60
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+    }
+
+    request = rf.get("/")
+    with freeze_time("2018-05-03 12:00:00"):
+        result = views.HealthCheckServiceView().dispatch(request, service="database")
+    assert result.status_code == 200
+    assert result["Last-Modified"] == "Thu, 03 May 2018 12:00:00 GMT"
+    assert result["X-Healthcheck-Checked-At"] == "database=2018-05-03T12:00:00Z"
+
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+        "cache": "django_healthchecks.contrib.check_dummy_true",
+    }
+    with freeze_time("2018-05-03 12:00:30"):
+        result = views.HealthCheckView().dispatch(request)
+    assert result.status_code == 200
+    assert result["Last-Modified"] == "Thu, 03 May 2018 12:00:00 GMT"
+    assert result["X-Healthcheck-Checked-At"] == (
+        "database=2018-05-03T12:00:00Z, cache=2018-05-03T12:00:30Z"
+    )
+
+
+def test_service_view_stale(rf, settings):
+    settings.HEALTH_CHECKS_CACHE_TTL = 60
+    settings.HEALTH_CHECKS_CACHE_MAX_STALE = 60
+    settings.HEALTH_CHECKS = {"database": check_slow_true}
+    checker.result_cache.set("database", checker.CheckResult(True, time.time() - 90))
+
+    request = rf.get("/")
+    result = views.HealthCheckServiceView().dispatch(request, service="database")
+    assert result.content == b"true"
+    assert result["X-Healthcheck-Stale"] == "database"
+
+    result = views.HealthCheckView().dispatch(request)
+    assert result["X-Healthcheck-Stale"] == "database"
+
+    while checker._revalidating:
+        time.sleep(0.05)
+
+
+def test_service_view_no_last_modified(rf, settings):
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+    }
+
+    request = rf.get("/")
+    result = views.HealthCheckServiceView().dispatch(request, service="database")
+    assert "Last-Modified" not in result
+
+
+def test_async_index_view(rf, settings):
+    settings.HEALTH_CHECKS_ERROR_CODE = 503
+    settings.HEALTH_CHECKS = {
+        "async": acheck_true,
+        "redis": "django_healthchecks.contrib.check_dummy_false",
+    }
+
+    view = views.AsyncHealthCheckView.as_view()
+    assert asyncio.iscoroutinefunction(view)
+
+    result = async_to_sync(view)(rf.get("/"))
+    data = json.loads(result.content.decode(result.charset))
+    assert result.status_code == 503
+    assert data == {"async": True, "redis": False}
+    assert "no-store" in result["Cache-Control"]
+
+
+def test_async_service_view(rf, settings):
+    settings.HEALTH_CHECKS = {"async": acheck_true}
+
+    view = views.AsyncHealthCheckServiceView.as_view()
+    result = async_to_sync(view)(rf.get("/"), service="async")
+    assert result.status_code == 200
+    assert result.content == b"true"
+    assert "no-store" in result["Cache-Control"]
+
+    with pytest.raises(Http404):
+        async_to_sync(view)(rf.get("/"), service="unknown")
+
+
+def test_async_service_require_auth(rf, settings):
+    settings.HEALTH_CHECKS = {"async": acheck_true}
+    settings.HEALTH_CHECKS_BASIC_AUTH = {"*": [("user", "password")]}
+
+    view = views.AsyncHealthCheckServiceView.as_view()
+    result = async_to_sync(view)(rf.get("/"), service="async")
+    assert result.status_code == 401
+
+
+def test_index_view_timings(rf, settings):
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+        "my service": "django_healthchecks.contrib.check_dummy_false",
+    }
+
+    result = views.HealthCheckView.as_view()(rf.get("/"))
+    assert "Server-Timing" not in result
+
+    result = views.HealthCheckView.as_view()(rf.get("/", {"timings": "1"}))
+    data = json.loads(result.content.decode(result.charset))
+    assert data == {"database": True, "my service": False}
+
+    timings = result["Server-Timing"].split(", ")
+    assert [timing.split(";")[0] for timing in timings] == ["database", "my_service"]
+    assert all(";dur=" in timing for timing in timings)
+
+
+def test_service_view_timings(rf, settings):
+    settings.HEALTH_CHECKS = {"async": acheck_true}
+
+    request = rf.get("/", {"timings": "1"})
+    result = views.HealthCheckServiceView.as_view()(request, service="async")
+    assert result["Server-Timing"].startswith("async;dur=")
+
+    view = views.AsyncHealthCheckServiceView.as_view()
+    result = async_to_sync(view)(request, service="async")
+    assert result["Server-Timing"].startswith("async;dur=")
+
+    view = views.AsyncHealthCheckView.as_view()
+    result = async_to_sync(view)(request)
+    assert result["Server-Timing"].startswith("async;dur=")
+
+
+def test_group_view(rf, settings):
+    settings.HEALTH_CHECKS_ERROR_CODE = 503
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+        "redis": "django_healthchecks.contrib.check_dummy_false",
+        "remote": "http://remote.com/api/healthchecks/",
+    }
+    settings.HEALTH_CHECKS_GROUPS = {
+        "readiness": ["database", "redis"],
+        "startup": ["database"],
+    }
+
+    view = views.HealthCheckView.as_view()
+    result = view(rf.get("/"), group="readiness")
+    data = json.loads(result.content.decode(result.charset))
+    assert result.status_code == 503
+    assert data == {"database": True, "redis": False}
+
+    result = async_to_sync(views.AsyncHealthCheckView.as_view())(
+        rf.get("/"), group="startup"
+    )
+    assert result.status_code == 200
+    assert json.loads(result.content.decode(result.charset)) == {"database": True}
+
+    with pytest.raises(Http404):
+        view(rf.get("/"), group="liveness")
+
+
+def test_group_view_liveness(rf, settings):
+    """The default liveness group doesn't run any checks, or use the database."""
+    settings.HEALTH_CHECKS_CACHE_ALIAS = "default"
+    settings.HEALTH_CHECKS_BASIC_AUTH = {"*": [("user", "password")]}
+    settings.HEALTH_CHECKS = {"broken": check_raises}
+
+    result = views.HealthCheckView.as_view()(rf.get("/"), group="liveness")
+    assert result.status_code == 200
+    assert json.loads(result.content.decode(result.charset)) == {}
+
+
+def test_group_unknown_check(settings):
+    settings.HEALTH_CHECKS = {"database": "django_healthchecks.contrib.check_database"}
+    settings.HEALTH_CHECKS_GROUPS = {"readiness": ["database", "redis"]}
+
+    with pytest.raises(ImproperlyConfigured):
+        checker.get_registry()
+
+
+def test_index_view_warning(rf, settings):
+    settings.HEALTH_CHECKS_ERROR_CODE = 503
+    settings.HEALTH_CHECKS_SEVERITY = {"redis": "warning"}
+    settings.HEALTH_CHECKS = {
+        "database": "django_healthchecks.contrib.check_dummy_true",
+        "redis": "django_healthchecks.contrib.check_dummy_false",
+    }
+
+    result = views.HealthCheckView.as_view()(rf.get("/"))
+    assert result.status_code == 200
+    assert json.loads(result.content.decode(result.charset)) == {
+        "database": True,
+        "redis": False,
+    }